@@ -0,0 +1,353 @@
+"""Headless batch mode: generate Bakin mask maps for whole texture directories.
+
+Each albedo is paired with its _emissive/_roughness/_metallic/_specular/_normal
+siblings by file name (``rock.png`` + ``rock_roughness.png``, or
+``rock_albedo.png`` + ``rock_roughness.png``) and run through the same pipeline
+as the GUI, one texture set per worker process.
+
+Usage:
+    python mask_map_batch.py textures/ "props/**/*_albedo.png" --workers 8
+"""
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from mask_map_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, OutputCache
+from mask_map_core import (ENCODE_PROFILES, MIP_CHAIN, RESIZE_FILTERS, ROUGHNESS_CONTRAST, SPECULAR_CONTRAST, TEXTURE_SUFFIXES,
+                           contrast_transforms, generate_texture_set)
+from mask_map_strips import generate_texture_set_in_strips
+from mask_map_trace import StageTracer, profile_call
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tga", ".bmp")
+ALBEDO_SUFFIX = "albedo"
+# Suffixes of maps the pipeline does not use. An image with one of them is only skipped
+# when another image in its directory has the same base name (rock_ao.png next to
+# rock.png), since words like "arm" or "mask" are also common in albedo names.
+OTHER_MAP_SUFFIXES = ("ao", "occlusion", "ambientocclusion", "height", "displacement", "disp", "bump", "opacity",
+                      "alpha", "mask", "cavity", "curvature", "gloss", "glossiness", "smoothness", "orm", "arm")
+OUTPUT_DIR_SUFFIX = "_bakin_textures"
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+# 2 is left to argparse, which exits with it on usage errors.
+EXIT_NO_INPUT = 3
+
+
+def split_texture_name(path, suffixes=TEXTURE_SUFFIXES + (ALBEDO_SUFFIX,)):
+    """Split a texture file name into (base name, one of suffixes or None)."""
+    stem = Path(path).stem
+    for suffix in suffixes:
+        if stem.lower().endswith("_" + suffix):
+            return stem[:-len(suffix) - 1], suffix
+    return stem, None
+
+
+def _scan_directory(directory):
+    """Return ({(base, channel): path}, {base: image count}) for the images in directory."""
+    siblings = {}
+    base_counts = {}
+    for name in sorted(os.listdir(directory or ".")):
+        sibling = os.path.join(directory, name)
+        if not _is_image(sibling):
+            continue
+        base, suffix = split_texture_name(sibling, TEXTURE_SUFFIXES + (ALBEDO_SUFFIX,) + OTHER_MAP_SUFFIXES)
+        base_counts[base] = base_counts.get(base, 0) + 1
+        if suffix in TEXTURE_SUFFIXES:
+            siblings.setdefault((base, suffix), sibling)
+    return siblings, base_counts
+
+
+def _is_image(path):
+    return os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def _in_output_dir(path):
+    return any(part.endswith(OUTPUT_DIR_SUFFIX) for part in Path(path).parent.parts)
+
+
+def _expand_inputs(inputs, recursive):
+    """Yield image files from directories and glob patterns."""
+    for item in inputs:
+        if os.path.isdir(item):
+            if recursive:
+                for dirpath, dirnames, filenames in os.walk(item):
+                    dirnames[:] = [d for d in dirnames if not d.endswith(OUTPUT_DIR_SUFFIX)]
+                    for name in filenames:
+                        yield os.path.join(dirpath, name)
+            else:
+                for name in os.listdir(item):
+                    yield os.path.join(item, name)
+        else:
+            yield from glob.glob(item, recursive=True)
+
+
+def find_texture_sets(inputs, recursive=False, skipped=None):
+    """Return a sorted list of (albedo_path, texture_paths) for every albedo found.
+
+    An image is treated as an albedo when its name carries no channel suffix (or the
+    _albedo suffix); texture_paths maps each channel suffix to the sibling texture
+    in the same directory, if one exists. An image named like one of
+    OTHER_MAP_SUFFIXES is only skipped when another image shares its base name; if
+    skipped is a list, (path, suffix) is appended to it for each such image.
+    """
+    scans = {}
+    texture_sets = {}
+    for path in _expand_inputs(inputs, recursive):
+        path = os.path.normpath(path)
+        if not _is_image(path) or _in_output_dir(path):
+            continue
+        base, suffix = split_texture_name(path)
+        if suffix not in (None, ALBEDO_SUFFIX):
+            continue
+
+        directory = os.path.dirname(path)
+        if directory not in scans:
+            scans[directory] = _scan_directory(directory)
+        siblings, base_counts = scans[directory]
+
+        if suffix is None:
+            other_base, other_suffix = split_texture_name(path, OTHER_MAP_SUFFIXES)
+            if other_suffix is not None and base_counts.get(other_base, 0) > 1:
+                if skipped is not None:
+                    skipped.append((path, other_suffix))
+                continue
+
+        texture_paths = {}
+        for channel in TEXTURE_SUFFIXES:
+            if (base, channel) in siblings:
+                texture_paths[channel] = siblings[(base, channel)]
+        texture_sets[path] = texture_paths
+    return sorted(texture_sets.items())
+
+
+_worker_caches = {}
+
+
+def _worker_cache(cache_dir, cache_bytes):
+    """One OutputCache per worker process, so its size is only scanned once."""
+    if cache_dir is None:
+        return None
+    if (cache_dir, cache_bytes) not in _worker_caches:
+        _worker_caches[(cache_dir, cache_bytes)] = OutputCache(cache_dir, cache_bytes)
+    return _worker_caches[(cache_dir, cache_bytes)]
+
+
+def process_texture_set(albedo_path, texture_paths, write_channels=True, cache_dir=None, cache_bytes=DEFAULT_MAX_BYTES,
+                        memory_budget=None, transforms=None, trace=False, encode_profile="default", encode_workers=1,
+                        write_constant_channels=True, levels=None, resize_filters=None, reduce_inputs=False,
+                        stage_workers=1):
+    """Worker entry point: returns (albedo_path, output_dir, error message or None, trace records)."""
+    tracer = StageTracer(set=albedo_path) if trace else None
+    try:
+        if memory_budget is not None:
+            output_dir = generate_texture_set_in_strips(albedo_path, texture_paths, write_channels=write_channels,
+                                                        memory_budget=memory_budget, transforms=transforms, tracer=tracer,
+                                                        encode_profile=encode_profile,
+                                                        write_constant_channels=write_constant_channels,
+                                                        resize_filters=resize_filters, reduce_inputs=reduce_inputs)
+        else:
+            cache = _worker_cache(cache_dir, cache_bytes)
+            output_dir = generate_texture_set(albedo_path, texture_paths, write_channels=write_channels, cache=cache,
+                                              transforms=transforms, tracer=tracer, encode_profile=encode_profile,
+                                              encode_workers=encode_workers, write_constant_channels=write_constant_channels,
+                                              levels=levels, resize_filters=resize_filters, reduce_inputs=reduce_inputs,
+                                              stage_workers=stage_workers)
+        error = None
+    except Exception as e:
+        output_dir, error = None, str(e) or type(e).__name__
+    return albedo_path, output_dir, error, tracer.records if tracer else []
+
+
+def parse_resize_filters(values):
+    """Turn --resize-filter values ("bilinear" or "metallic=bilinear") into a {suffix: filter} dict."""
+    resize_filters = {}
+    for value in values or ():
+        channel, _, name = value.rpartition("=")
+        if name not in RESIZE_FILTERS:
+            raise ValueError(f"unknown resize filter {name!r}, expected one of {', '.join(RESIZE_FILTERS)}")
+        if channel and channel not in TEXTURE_SUFFIXES:
+            raise ValueError(f"unknown channel {channel!r}, expected one of {', '.join(TEXTURE_SUFFIXES)}")
+        for suffix in [channel] if channel else TEXTURE_SUFFIXES:
+            resize_filters[suffix] = name
+    return resize_filters
+
+
+def _run_isolated(albedo_path, texture_paths, options):
+    """Run one texture set in a worker process of its own, so a crash only fails that set."""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(process_texture_set, albedo_path, texture_paths, **options).result()
+
+
+def run_batch(texture_sets, workers=None, tracer=None, out=sys.stderr, **options):
+    """Process texture sets on a process pool and return a list of (albedo_path, error).
+
+    options are passed on to process_texture_set; with a tracer, the stage records of
+    every worker are collected into it. If a worker process dies (e.g. killed for
+    running out of memory), the pool breaks and every set it had not finished is run
+    again, each in a process of its own, so only the set that crashes fails.
+    """
+    failures = []
+    total = len(texture_sets)
+    options["trace"] = tracer is not None
+    done = 0
+    unfinished = []
+
+    def finish(albedo_path, future):
+        nonlocal done
+        done += 1
+        try:
+            _, _, error, records = future.result()
+        except BrokenProcessPool:
+            error, records = "worker process crashed (out of memory?)", []
+        except Exception as e:
+            error, records = str(e) or type(e).__name__, []
+        if tracer is not None:
+            tracer.extend(records)
+        if error is None:
+            print(f"[{done}/{total}] ok      {albedo_path}", file=out)
+        else:
+            failures.append((albedo_path, error))
+            print(f"[{done}/{total}] FAILED  {albedo_path}: {error}", file=out)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_texture_set, albedo_path, texture_paths, **options): (albedo_path, texture_paths)
+                   for albedo_path, texture_paths in texture_sets}
+        for future in as_completed(futures):
+            if isinstance(future.exception(), BrokenProcessPool):
+                unfinished.append(futures[future])
+            else:
+                finish(futures[future][0], future)
+
+    if unfinished:
+        print(f"A worker process crashed; retrying {len(unfinished)} texture sets in separate processes.", file=out)
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as runner:
+            futures = {runner.submit(_run_isolated, albedo_path, texture_paths, options): albedo_path
+                       for albedo_path, texture_paths in sorted(unfinished)}
+            for future in as_completed(futures):
+                finish(futures[future], future)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Bakin mask maps for texture directories without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="Directories or glob patterns of albedo textures.")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Descend into subdirectories of directory inputs.")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Number of worker processes (default: CPU count).")
+    parser.add_argument("--skip-channel-files", action="store_true",
+                        help="Only write the albedo, normal and mask maps, not the emissive/roughness/metallic/specular files.")
+    parser.add_argument("--skip-constant-channels", action="store_true",
+                        help="Do not write the all-black emissive/metallic files of sets that have no such input.")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_DIR, default=None, metavar="DIR",
+                        help=f"Reuse outputs of unchanged texture sets from a cache directory (default: {DEFAULT_CACHE_DIR}).")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES // 1024 ** 2, metavar="MB",
+                        help="Maximum cache size in megabytes; least recently used entries are evicted first.")
+    parser.add_argument("--memory-budget", type=int, default=None, metavar="MB",
+                        help="Process each texture in horizontal strips sized to this many megabytes per worker (for very large textures).")
+    level_group = parser.add_mutually_exclusive_group()
+    level_group.add_argument("--levels", type=int, nargs="+", metavar="PX",
+                             help="Also write downscaled copies with these longest sides (e.g. 2048 1024 512) "
+                                  "to subfolders of each output folder.")
+    level_group.add_argument("--mip-chain", action="store_true",
+                             help="Also write every mip level, halving down to 1x1, to subfolders of each output folder.")
+    parser.add_argument("--resize-filter", action="append", metavar="[CHANNEL=]FILTER",
+                        help=f"Filter for inputs that do not match the albedo size: {', '.join(RESIZE_FILTERS)} "
+                             "(default: lanczos). Prefix a channel to set it for that channel only, e.g. metallic=bilinear; "
+                             "may be repeated.")
+    parser.add_argument("--reduce-inputs", action="store_true",
+                        help="Downscale inputs that are an exact integer multiple of the albedo size with a fast box filter.")
+    parser.add_argument("--stage-workers", type=int, default=1, metavar="N",
+                        help="Threads per worker for the channel stages, so inputs are decoded and resized side by side.")
+    parser.add_argument("--encode-profile", choices=tuple(ENCODE_PROFILES), default="default",
+                        help="PNG compression: fast (larger files, quick to write), default, or max (smallest files, slowest).")
+    parser.add_argument("--encode-workers", type=int, default=1, metavar="N",
+                        help="Threads per worker that encode PNGs while the next stages run (default: %(default)s).")
+    parser.add_argument("--roughness-contrast", type=float, default=ROUGHNESS_CONTRAST, metavar="F",
+                        help=f"Contrast factor of the generated roughness map (default: {ROUGHNESS_CONTRAST}).")
+    parser.add_argument("--specular-contrast", type=float, default=SPECULAR_CONTRAST, metavar="F",
+                        help=f"Contrast factor of the generated specular map (default: {SPECULAR_CONTRAST}).")
+    parser.add_argument("--roughness-gamma", type=float, default=1.0, metavar="G", help="Gamma applied after the roughness contrast.")
+    parser.add_argument("--specular-gamma", type=float, default=1.0, metavar="G", help="Gamma applied after the specular contrast.")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="Write per-stage timings of every texture set to PATH (.json, .csv, or .trace.json for Chrome tracing).")
+    parser.add_argument("--trace-format", choices=("json", "csv", "chrome"), default=None,
+                        help="Format of --trace (default: guessed from the file extension).")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="Profile a single run with cProfile: only the first texture set is processed, in this process, "
+                             "and the stats are written to PATH.")
+    args = parser.parse_args(argv)
+    for name in ("workers", "stage_workers", "encode_workers"):
+        value = getattr(args, name)
+        if value is not None and value < 1:
+            parser.error(f"--{name.replace('_', '-')} must be at least 1")
+    if args.memory_budget is not None and args.cache is not None:
+        parser.error("--memory-budget cannot be combined with --cache")
+    if args.memory_budget is not None and (args.levels or args.mip_chain):
+        parser.error("--memory-budget cannot be combined with --levels or --mip-chain")
+    if args.memory_budget is not None and (args.stage_workers != 1 or args.encode_workers != 1):
+        parser.error("--memory-budget cannot be combined with --stage-workers or --encode-workers")
+
+    transforms = contrast_transforms(args.roughness_contrast, args.specular_contrast)
+    try:
+        if args.roughness_gamma != 1.0:
+            transforms["roughness"] = transforms["roughness"].gamma(args.roughness_gamma)
+        if args.specular_gamma != 1.0:
+            transforms["specular"] = transforms["specular"].gamma(args.specular_gamma)
+        resize_filters = parse_resize_filters(args.resize_filter)
+    except ValueError as e:
+        parser.error(str(e))
+
+    skipped = []
+    texture_sets = find_texture_sets(args.inputs, recursive=args.recursive, skipped=skipped)
+    for path, suffix in sorted(set(skipped)):
+        print(f"skipped {path}: looks like the _{suffix} map of another texture", file=sys.stderr)
+    if not texture_sets:
+        print("No albedo textures found.", file=sys.stderr)
+        return EXIT_NO_INPUT
+
+    options = {
+        "write_channels": not args.skip_channel_files,
+        "write_constant_channels": not args.skip_constant_channels,
+        "cache_dir": args.cache,
+        "cache_bytes": args.cache_size * 1024 ** 2,
+        "memory_budget": args.memory_budget * 1024 ** 2 if args.memory_budget is not None else None,
+        "transforms": transforms,
+        "encode_profile": args.encode_profile,
+        "encode_workers": args.encode_workers,
+        "levels": MIP_CHAIN if args.mip_chain else args.levels,
+        "resize_filters": resize_filters,
+        "reduce_inputs": args.reduce_inputs,
+        "stage_workers": args.stage_workers,
+    }
+    tracer = StageTracer() if args.trace else None
+
+    if args.profile:
+        albedo_path, texture_paths = texture_sets[0]
+        options["trace"] = tracer is not None
+        # cProfile only sees the calling thread, so run the stages and encodes inline.
+        options["stage_workers"] = options["encode_workers"] = 0
+        (_, _, error, records), summary = profile_call(
+            lambda: process_texture_set(albedo_path, texture_paths, **options), args.profile)
+        print(summary, file=sys.stderr)
+        if tracer is not None:
+            tracer.extend(records)
+            tracer.export(args.trace, args.trace_format)
+        if error is not None:
+            print(f"FAILED  {albedo_path}: {error}", file=sys.stderr)
+            return EXIT_FAILURES
+        return EXIT_OK
+
+    failures = run_batch(texture_sets, workers=args.workers, tracer=tracer, **options)
+    if tracer is not None:
+        tracer.export(args.trace, args.trace_format)
+    print(f"{len(texture_sets) - len(failures)}/{len(texture_sets)} texture sets generated, {len(failures)} failed.", file=sys.stderr)
+    for albedo_path, error in failures:
+        print(f"  {albedo_path}: {error}", file=sys.stderr)
+    return EXIT_FAILURES if failures else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""Benchmark every stage of the mask map pipeline on synthetic textures.
+
+Generates deterministic albedos (and optionally emissive/roughness/metallic inputs at
+half resolution, to exercise resizing) for each requested size and runs them through
+mask_map_core.generate_texture_set with a StageTracer, on the calling thread, so the
+timings follow exactly what the pipeline does (e.g. PNG albedos are copied byte for
+byte, not re-encoded). The tracer's records are summed into the stages below.
+
+Peak memory is measured in a second pass: the pipeline runs again in a fresh process
+with a tracer that reports how far the resident set size (RSS) rose during each
+stage. Unlike tracemalloc, this includes Pillow and zlib buffers, and it does not
+slow down the timed runs. Results are printed as a table and can be written to JSON
+and compared against a saved baseline.
+
+Usage:
+    python mask_map_bench.py --sizes 512 1024 2048 --repeat 3 --json bench.json
+    python mask_map_bench.py --baseline bench.json --tolerance 0.15
+"""
+import argparse
+import ctypes
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+from PIL import Image
+
+from mask_map_core import generate_texture_set
+from mask_map_trace import StageTracer
+
+DEFAULT_SIZES = (512, 1024, 2048, 4096)
+INPUT_CHANNELS = ("emissive", "roughness", "metallic")
+# "resize" covers decoding and resizing the channel inputs, "encode" every PNG written.
+STAGES = ("decode", "albedo_copy", "roughness", "specular", "normal", "resize", "pack", "encode")
+# Stages faster than this in the baseline are too noisy to flag as regressions.
+MIN_COMPARABLE_SECONDS = 0.001
+EXIT_OK = 0
+EXIT_REGRESSION = 1
+
+
+def synthetic_albedo(size, seed=0):
+    """A deterministic RGB albedo with large smooth features plus fine noise."""
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (size // 32 + 2, size // 32 + 2, 3), dtype=np.uint8)
+    img = Image.fromarray(coarse).resize((size, size), Image.BICUBIC)
+    noisy = np.array(img, dtype=np.int16) + rng.integers(-24, 25, (size, size, 3), dtype=np.int16)
+    return Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8))
+
+
+def synthetic_channel(size, seed):
+    """A deterministic grayscale channel input."""
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (size // 16 + 2, size // 16 + 2), dtype=np.uint8)
+    return Image.fromarray(coarse).resize((size, size), Image.BILINEAR)
+
+
+def bench_stage(record_name):
+    """The benchmark stage a mask_map_core tracer record counts towards, or None."""
+    channel, _, step = record_name.partition(".")
+    if channel == "albedo":
+        return "albedo_copy" if step in ("copy", "encode") else "decode"
+    if step == "derive":
+        return channel if channel in STAGES else None
+    if step in ("decode", "resize", "copy"):
+        return "resize"
+    if step == "encode":
+        return "encode"
+    if record_name == "mask.pack":
+        return "pack"
+    return None
+
+
+def _prepare_inputs(size, work_dir, with_inputs=False):
+    """Write the synthetic textures for size into work_dir once; returns (albedo_path, input_paths)."""
+    albedo_path = os.path.join(work_dir, f"albedo_{size}.png")
+    if not os.path.exists(albedo_path):
+        synthetic_albedo(size).save(albedo_path)
+    input_paths = {}
+    if with_inputs:
+        for seed, suffix in enumerate(INPUT_CHANNELS, 1):
+            input_paths[suffix] = os.path.join(work_dir, f"{suffix}_{size}.png")
+            if not os.path.exists(input_paths[suffix]):
+                synthetic_channel(max(size // 2, 1), seed).save(input_paths[suffix])
+    return albedo_path, input_paths
+
+
+def _run_pipeline(size, work_dir, with_inputs, tracer):
+    """Run generate_texture_set for one synthetic texture set with every stage on this thread."""
+    albedo_path, input_paths = _prepare_inputs(size, work_dir, with_inputs)
+    generate_texture_set(albedo_path, input_paths, stage_workers=0, encode_workers=0, tracer=tracer)
+
+
+def bench_size(size, work_dir, with_inputs=False):
+    """Time every stage once for one synthetic texture set; returns {stage: seconds}."""
+    tracer = StageTracer()
+    _run_pipeline(size, work_dir, with_inputs, tracer)
+    results = {}
+    for record in tracer.records:
+        stage = bench_stage(record["name"])
+        if stage is not None:
+            results[stage] = results.get(stage, 0.0) + record["wall"]
+    return results
+
+
+def _ru_maxrss_bytes():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _rss_bytes():
+    """(current, peak) RSS of this process in bytes; either may be None where unavailable.
+
+    Linux reports both in /proc; elsewhere only the peak is known, through getrusage.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["VmRSS"].split()[0]) * 1024, int(fields["VmHWM"].split()[0]) * 1024
+    except (OSError, KeyError, ValueError):
+        return None, _ru_maxrss_bytes()
+
+
+def _release_free_memory():
+    """Return freed heap memory to the OS, so a stage cannot reuse pages that are still resident."""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):  # not glibc
+        pass
+
+
+def _reset_peak_rss():
+    """Reset the RSS high-water mark to the current RSS (Linux only); returns whether it worked."""
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class _RssTracer:
+    """A tracer that records how far RSS rose during each benchmark stage, in bytes.
+
+    Where the high-water mark cannot be reset, the rise is measured from the peak
+    before the stage, which underestimates stages that need less than the ones
+    before them.
+    """
+
+    def __init__(self):
+        self.peaks = {}
+
+    @contextmanager
+    def stage(self, name, input_path=None, **attrs):
+        stage = bench_stage(name)
+        if stage is None:
+            yield {}
+            return
+        _release_free_memory()
+        current, peak = _rss_bytes()
+        before = current if _reset_peak_rss() else peak
+        yield {}
+        peak = _rss_bytes()[1]
+        rise = max(peak - before, 0) if peak is not None and before is not None else float("nan")
+        self.peaks[stage] = max(self.peaks.get(stage, 0), rise)
+
+
+def _pipeline_memory(size, work_dir, with_inputs):
+    """Run the pipeline in this (fresh) process; returns {stage: peak RSS rise in bytes}."""
+    tracer = _RssTracer()
+    _run_pipeline(size, work_dir, with_inputs, tracer)
+    return tracer.peaks
+
+
+def bench_memory(size, work_dir, with_inputs=False):
+    """Measure the peak RSS of every stage in a fresh process; returns {stage: bytes}."""
+    _prepare_inputs(size, work_dir, with_inputs)
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(_pipeline_memory, size, work_dir, with_inputs).result()
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=1, with_inputs=False, out=sys.stderr):
+    """Benchmark all sizes; each stage keeps its fastest time over repeat runs.
+
+    Memory is measured once per size, after the timed runs.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bakin_bench_") as work_dir:
+        for size in sizes:
+            best = {}
+            for run in range(repeat):
+                print(f"{size}px run {run + 1}/{repeat}...", file=out)
+                for stage, seconds in bench_size(size, work_dir, with_inputs).items():
+                    best[stage] = min(best.get(stage, float("inf")), seconds)
+            print(f"{size}px memory...", file=out)
+            peaks = bench_memory(size, work_dir, with_inputs)
+            results[str(size)] = {stage: {"seconds": seconds, "peak_mb": peaks.get(stage, 0) / 1024 ** 2}
+                                  for stage, seconds in best.items()}
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pillow": Image.__version__,
+            "machine": platform.machine(),
+            "repeat": repeat,
+            "with_inputs": with_inputs,
+        },
+        "results": results,
+    }
+
+
+def format_table(report, baseline=None):
+    """Render results as a text table, with a vs-baseline ratio column when given."""
+    header = f"{'size':>6}  {'stage':<12} {'seconds':>10} {'peak MB':>9}"
+    if baseline:
+        header += f" {'vs base':>8}"
+    lines = [header, "-" * len(header)]
+    for size, stages in report["results"].items():
+        total = 0.0
+        for stage in STAGES:
+            if stage not in stages:
+                continue
+            seconds = stages[stage]["seconds"]
+            total += seconds
+            line = f"{size:>6}  {stage:<12} {seconds:>10.4f} {stages[stage]['peak_mb']:>9.1f}"
+            base = (baseline or {}).get("results", {}).get(size, {}).get(stage)
+            if baseline:
+                line += f" {seconds / base['seconds']:>7.2f}x" if base and base["seconds"] > 0 else f" {'-':>8}"
+            lines.append(line)
+        lines.append(f"{size:>6}  {'total':<12} {total:>10.4f}")
+    return "\n".join(lines)
+
+
+def find_regressions(report, baseline, tolerance):
+    """Return (size, stage, ratio) for every stage slower than baseline by more than tolerance."""
+    regressions = []
+    for size, stages in report["results"].items():
+        for stage, values in stages.items():
+            base = baseline.get("results", {}).get(size, {}).get(stage)
+            if base and base["seconds"] >= MIN_COMPARABLE_SECONDS:
+                ratio = values["seconds"] / base["seconds"]
+                if ratio > 1.0 + tolerance:
+                    regressions.append((size, stage, ratio))
+    return regressions
+
+
+def _peak_rss_mb():
+    peak = _ru_maxrss_bytes()
+    return peak / 1024 ** 2 if peak is not None else float("nan")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Bakin mask map pipeline stage by stage.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), metavar="PX",
+                        help="Square texture sizes to benchmark (default: %(default)s).")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per size; the fastest time per stage is kept.")
+    parser.add_argument("--with-inputs", action="store_true",
+                        help="Also supply half-resolution emissive/roughness/metallic inputs to time resizing.")
+    parser.add_argument("--json", metavar="PATH", help="Write the results as JSON.")
+    parser.add_argument("--baseline", metavar="PATH", help="Compare against a JSON file written by --json.")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Allowed slowdown against the baseline before a stage counts as a regression.")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    if baseline and baseline.get("meta", {}).get("with_inputs") != args.with_inputs:
+        print("warning: baseline was recorded with a different --with-inputs setting", file=sys.stderr)
+
+    report = run_benchmarks(args.sizes, max(args.repeat, 1), args.with_inputs)
+    print(format_table(report, baseline))
+    print(f"process peak RSS: {_peak_rss_mb():.0f} MB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if baseline:
+        regressions = find_regressions(report, baseline, args.tolerance)
+        for size, stage, ratio in regressions:
+            print(f"REGRESSION {size}px {stage}: {ratio:.2f}x baseline", file=sys.stderr)
+        if regressions:
+            return EXIT_REGRESSION
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
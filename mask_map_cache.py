@@ -0,0 +1,134 @@
+"""Content-addressed cache for generated textures and derived channel arrays.
+
+Entries are keyed on a hash of the stage inputs (file contents and generation
+parameters), so an unchanged texture set can be restored by copying files instead
+of decoding, deriving and encoding it again. The cache directory is shared safely
+between processes and trimmed to a size budget, least recently used first.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "bakin_mask_map")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(*parts):
+    """Combine stage name, input digests and parameters into one cache key."""
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+
+class OutputCache:
+    """A directory of <key>.png / <key>.npy entries with size-based LRU eviction.
+
+    Recency is tracked through file modification times, which are bumped on every
+    hit, so several worker processes can share one cache directory.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._size = None
+
+    def _path(self, key, extension):
+        return os.path.join(self.cache_dir, key[:2], key + extension)
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def _publish(self, key, extension, write):
+        """Write an entry through a temporary file so readers never see partial data."""
+        path = self._path(key, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        if self._size is not None:
+            self._size += os.path.getsize(path)
+        if self._size is None or self._size > self.max_bytes:
+            self.evict()
+
+    def restore(self, key, output_path=None, want_array=False):
+        """Restore a cached stage.
+
+        Copies the cached PNG to output_path (if given) and loads the cached array
+        (if want_array). Returns (hit, array); on a miss nothing is written.
+        """
+        png_path = self._path(key, ".png")
+        npy_path = self._path(key, ".npy")
+        if (output_path and not os.path.exists(png_path)) or (want_array and not os.path.exists(npy_path)):
+            self.misses += 1
+            return False, None
+        try:
+            array = np.load(npy_path) if want_array else None
+            if output_path:
+                shutil.copyfile(png_path, output_path)
+        except (OSError, ValueError):
+            # Evicted by another process between the check and the read.
+            self.misses += 1
+            return False, None
+        for path in (png_path, npy_path):
+            self._touch(path)
+        self.hits += 1
+        return True, array
+
+    def store(self, key, output_path=None, array=None):
+        """Store a stage's written PNG and/or its derived array under key."""
+        if output_path:
+            with open(output_path, "rb") as src:
+                self._publish(key, ".png", lambda f: shutil.copyfileobj(src, f))
+        if array is not None:
+            self._publish(key, ".npy", lambda f: np.save(f, array))
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._size = total
@@ -0,0 +1,761 @@
+"""GUI-free image pipeline of the Bakin Mask Map Generator.
+
+Everything here works on NumPy arrays or file paths and reports progress through
+callbacks, so it can be imported by the GUI, the batch CLI or render-farm workers
+without tkinter or a display.
+"""
+import os
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from PIL import Image
+import numpy as np
+from mask_map_cache import cache_key, file_digest
+from mask_map_trace import NULL_TRACER
+from mask_map_transforms import ChannelTransform
+
+SOBEL_TILE_ROWS = 256
+
+ROUGHNESS_CONTRAST = 1.5
+SPECULAR_CONTRAST = 2.0
+ROUGHNESS_TRANSFORM = ChannelTransform().invert().contrast(ROUGHNESS_CONTRAST)
+SPECULAR_TRANSFORM = ChannelTransform().contrast(SPECULAR_CONTRAST)
+RESIZE_FILTER = Image.LANCZOS
+# Filters that can be chosen per channel for inputs that do not match the albedo size.
+RESIZE_FILTERS = {
+    "nearest": Image.NEAREST,
+    "bilinear": Image.BILINEAR,
+    "bicubic": Image.BICUBIC,
+    "lanczos": Image.LANCZOS,
+}
+# Image.save keyword arguments per PNG encode profile; "default" is Pillow's own setting.
+ENCODE_PROFILES = {
+    "fast": {"compress_level": 1},
+    "default": {},
+    "max": {"optimize": True},
+}
+# Bump when a derivation changes so that cached outputs are not reused.
+PIPELINE_VERSION = 1
+# Pass as levels= to generate a full mip chain instead of a list of sizes.
+MIP_CHAIN = "mip"
+
+
+def _sobel_rows(gray, grad_x, grad_y, row_start, row_stop):
+    """Fill rows [row_start, row_stop) of grad_x/grad_y with the 3x3 Sobel response of gray.
+
+    The 3x3 kernels are applied as separable shifted-array sums in integer math, so the
+    result is exactly what a per-pixel convolution would give.
+    Border rows and columns are left untouched (zero).
+    """
+    height, width = gray.shape
+    row_start = max(row_start, 1)
+    row_stop = min(row_stop, height - 1)
+    if row_start >= row_stop or width < 3:
+        return
+    band = gray[row_start - 1:row_stop + 1].astype(np.int32)
+    top, mid, bottom = band[:-2], band[1:-1], band[2:]
+
+    smooth = top + 2 * mid + bottom
+    grad_x[row_start:row_stop, 1:-1] = smooth[:, :-2] - smooth[:, 2:]
+
+    diff = top - bottom
+    grad_y[row_start:row_stop, 1:-1] = diff[:, :-2] + 2 * diff[:, 1:-1] + diff[:, 2:]
+
+
+def sobel_gradients(gray):
+    """Return the (grad_x, grad_y) Sobel gradients of a 2D grayscale array as float arrays."""
+    grad_x = np.zeros(gray.shape, dtype=float)
+    grad_y = np.zeros(gray.shape, dtype=float)
+    _sobel_rows(gray, grad_x, grad_y, 0, gray.shape[0])
+    return grad_x, grad_y
+
+
+def sobel_gradients_tiled(gray, tile_rows=SOBEL_TILE_ROWS):
+    """Same as sobel_gradients, but works in horizontal bands of tile_rows rows.
+
+    Only one band of integer temporaries is alive at a time, which keeps peak memory
+    bounded on very large (8K+) textures.
+    """
+    grad_x = np.zeros(gray.shape, dtype=float)
+    grad_y = np.zeros(gray.shape, dtype=float)
+    tile_rows = max(int(tile_rows), 1)
+    for row_start in range(0, gray.shape[0], tile_rows):
+        _sobel_rows(gray, grad_x, grad_y, row_start, row_start + tile_rows)
+    return grad_x, grad_y
+
+
+def sobel_band(gray, top, bottom):
+    """Sobel gradients of rows [top, bottom) of gray, reading one halo row on each side."""
+    height, width = gray.shape
+    halo_top = max(top - 1, 0)
+    halo_bottom = min(bottom + 1, height)
+    window = np.asarray(gray[halo_top:halo_bottom])
+    grad_x = np.zeros(window.shape, dtype=float)
+    grad_y = np.zeros(window.shape, dtype=float)
+    # Rows on the image border stay zero, exactly like the whole-image gradients.
+    row_start = top - halo_top if top > 0 else 1
+    row_stop = bottom - halo_top if bottom < height else window.shape[0] - 1
+    _sobel_rows(window, grad_x, grad_y, row_start, row_stop)
+    return grad_x[top - halo_top:bottom - halo_top], grad_y[top - halo_top:bottom - halo_top]
+
+
+def gradient_max(gray, top, bottom):
+    """The largest absolute (grad_x, grad_y) of rows [top, bottom) of gray."""
+    grad_x, grad_y = sobel_band(gray, top, bottom)
+    return float(np.max(np.abs(grad_x))), float(np.max(np.abs(grad_y)))
+
+
+def normal_band(gray, top, bottom, max_grad_x, max_grad_y):
+    """Rows [top, bottom) of the RGB normal map, normalised by the whole image's largest gradients."""
+    grad_x, grad_y = sobel_band(gray, top, bottom)
+    band = np.empty(grad_x.shape + (3,), dtype=np.uint8)
+    band[..., 0] = (grad_x / max_grad_x * 127.5 + 127.5).astype(np.uint8)
+    band[..., 1] = (grad_y / max_grad_y * 127.5 + 127.5).astype(np.uint8)
+    band[..., 2] = 255
+    return band
+
+
+TEXTURE_SUFFIXES = ("emissive", "roughness", "metallic", "specular", "normal")
+
+
+class MaskMapError(Exception):
+    """A pipeline failure; key and params select the user-facing translation."""
+
+    def __init__(self, key, error=None, **params):
+        self.key = key
+        self.params = dict(params, error=str(error))
+        stage = params.get("suffix", key.replace("error_", "", 1))
+        super().__init__(f"{stage}: {error}" if error is not None else stage)
+
+
+class MaskMapCancelled(MaskMapError):
+    """Raised when a run is stopped through its cancel_event."""
+
+    def __init__(self):
+        super().__init__("progress_cancelled")
+
+
+class ConstantChannel:
+    """A channel whose pixels all have one value, carried through the pipeline without pixel data.
+
+    shape is the (height, width) of the array it stands for. pack_mask_map fills it with
+    a single broadcast write, and pixels are only produced when a file is saved.
+    """
+
+    def __init__(self, value, shape):
+        self.value = int(value)
+        self.shape = tuple(shape)
+
+    @property
+    def size(self):
+        """The (width, height) of the channel, as Pillow counts it."""
+        return self.shape[1], self.shape[0]
+
+    def to_array(self):
+        """A read-only uint8 view of the channel that allocates no pixels."""
+        return np.broadcast_to(np.uint8(self.value), self.shape)
+
+    def save(self, output_path, profile="default"):
+        """Write the channel as an L PNG."""
+        img = Image.new("L", self.size, self.value)
+        img.save(output_path, **encode_options(profile))
+        img.close()
+
+    def __eq__(self, other):
+        return isinstance(other, ConstantChannel) and (self.value, self.shape) == (other.value, other.shape)
+
+    def __hash__(self):
+        return hash((self.value, self.shape))
+
+    def __repr__(self):
+        return f"ConstantChannel({self.value!r}, {self.shape!r})"
+
+
+def load_grayscale(path):
+    """Decode a texture as an 8-bit grayscale (L) array."""
+    with Image.open(path) as img:
+        return np.array(img.convert("L"))
+
+
+def encode_options(profile="default"):
+    """Return the Image.save keyword arguments of an ENCODE_PROFILES entry."""
+    try:
+        return ENCODE_PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"unknown encode profile {profile!r}, expected one of {', '.join(ENCODE_PROFILES)}") from None
+
+
+def save_array(array, output_path, profile="default"):
+    """Encode a uint8 L/RGB/RGBA array to output_path with the given encode profile."""
+    img = Image.fromarray(array)
+    img.save(output_path, **encode_options(profile))
+    img.close()
+
+
+def save_image(img, output_path, profile="default"):
+    """Encode a Pillow image or a ConstantChannel to output_path with the given encode profile."""
+    if isinstance(img, ConstantChannel):
+        img.save(output_path, profile)
+    else:
+        img.save(output_path, **encode_options(profile))
+
+
+def can_copy_bytes(img):
+    """True if img was opened from a single-frame PNG, so its file can be copied unchanged."""
+    return img.format == "PNG" and not getattr(img, "is_animated", False)
+
+
+def resize_filter_for(suffix, resize_filters=None):
+    """The Pillow filter used to resize the suffix input; resize_filters maps suffixes to RESIZE_FILTERS names."""
+    name = (resize_filters or {}).get(suffix)
+    if name is None:
+        return RESIZE_FILTER
+    try:
+        return RESIZE_FILTERS[name]
+    except KeyError:
+        raise ValueError(f"unknown resize filter {name!r}, expected one of {', '.join(RESIZE_FILTERS)}") from None
+
+
+def resize_input(img, size, resample=RESIZE_FILTER, reduce=False):
+    """Resize img to size with resample.
+
+    With reduce, downscales by an exact integer factor use the box filter of
+    Image.reduce instead, which is much faster than resampling.
+    """
+    if reduce:
+        factor_x, factor_y = img.width // size[0], img.height // size[1]
+        if factor_x * size[0] == img.width and factor_y * size[1] == img.height and factor_x * factor_y > 1:
+            try:
+                return img.reduce((factor_x, factor_y))
+            except ValueError:  # modes such as P and I;16 cannot be reduced
+                pass
+    return img.resize(size, resample)
+
+
+def normal_from_gray(gray, tile_rows=SOBEL_TILE_ROWS):
+    """Derive a simple RGB normal map array from a grayscale array using Sobel edge detection.
+
+    Works in bands of tile_rows rows: a first pass finds the largest gradients, a
+    second normalises each band straight into the uint8 result. Only one band of
+    float gradients is alive at a time, so memory beyond the result stays bounded
+    on very large textures.
+    """
+    height = gray.shape[0]
+    tile_rows = max(int(tile_rows), 1)
+    bands = [(top, min(top + tile_rows, height)) for top in range(0, height, tile_rows)]
+    maxima = [gradient_max(gray, top, bottom) for top, bottom in bands]
+    max_grad_x = max(band_max[0] for band_max in maxima)
+    max_grad_y = max(band_max[1] for band_max in maxima)
+
+    normal = np.empty(gray.shape + (3,), dtype=np.uint8)
+    for top, bottom in bands:
+        normal[top:bottom] = normal_band(gray, top, bottom, max_grad_x, max_grad_y)
+    return normal
+
+
+def roughness_from_gray(gray, transform=ROUGHNESS_TRANSFORM):
+    """Derive a roughness array from a grayscale array (inverted with contrast by default)."""
+    return transform.apply(gray)
+
+
+def specular_from_gray(gray, transform=SPECULAR_TRANSFORM):
+    """Derive a specular array from a grayscale array (high contrast by default)."""
+    return transform.apply(gray)
+
+
+def pack_mask_map(emissive, roughness, metallic, specular):
+    """Pack four same-sized L arrays into a Bakin RGBA mask map array.
+
+    Emissive goes to R, roughness to G, metallic to B and specular to A. Any of them may
+    be a ConstantChannel, which is filled in with one broadcast write.
+    """
+    channels = (emissive, roughness, metallic, specular)
+    mask_map_array = np.empty(emissive.shape + (4,), dtype=np.uint8)
+    for index, channel in enumerate(channels):
+        mask_map_array[..., index] = channel.value if isinstance(channel, ConstantChannel) else channel
+    return mask_map_array
+
+
+def output_dir_for(albedo_path):
+    """Return the <albedo>_bakin_textures folder next to the albedo."""
+    albedo_name = Path(albedo_path).stem
+    return os.path.join(os.path.dirname(albedo_path), f"{albedo_name}_bakin_textures")
+
+
+MASK_CHANNELS = ("emissive", "roughness", "metallic", "specular")
+
+
+DEFAULT_TRANSFORMS = {
+    "roughness": ROUGHNESS_TRANSFORM,
+    "specular": SPECULAR_TRANSFORM,
+}
+
+
+def generation_params():
+    """The parameters that affect generated pixels, as part of every cache key."""
+    return (PIPELINE_VERSION, int(RESIZE_FILTER), SOBEL_TILE_ROWS)
+
+
+def contrast_transforms(roughness_contrast=ROUGHNESS_CONTRAST, specular_contrast=SPECULAR_CONTRAST):
+    """Roughness and specular transforms with the given contrast factors, for transforms=."""
+    return {
+        "roughness": ChannelTransform().invert().contrast(roughness_contrast),
+        "specular": ChannelTransform().contrast(specular_contrast),
+    }
+
+
+def channel_transforms(transforms=None):
+    """DEFAULT_TRANSFORMS with the per-channel overrides in transforms applied."""
+    return dict(DEFAULT_TRANSFORMS, **(transforms or {}))
+
+
+def is_constant_channel(suffix, transforms=None):
+    """True if the derived suffix channel does not depend on the albedo (it is black)."""
+    return suffix != "normal" and suffix not in channel_transforms(transforms)
+
+
+def derive_channel(suffix, gray, transforms=None):
+    """Derive the suffix channel from the albedo grayscale array.
+
+    The normal map comes from the Sobel gradients; other channels apply their
+    ChannelTransform from channel_transforms(transforms), and channels without one
+    are a black ConstantChannel.
+    """
+    if suffix == "normal":
+        return normal_from_gray(gray)
+    if is_constant_channel(suffix, transforms):
+        return ConstantChannel(0, gray.shape)
+    return channel_transforms(transforms)[suffix].apply(gray)
+
+
+def level_sizes(size, levels):
+    """The (width, height) of every downscaled level of a size texture, largest first.
+
+    levels lists the longest side of each level, e.g. (2048, 1024, 512), or is MIP_CHAIN
+    for a full mip chain that halves down to 1x1. Sizes not below the texture's are skipped.
+    """
+    width, height = size
+    sizes = []
+    if levels == MIP_CHAIN:
+        while width > 1 or height > 1:
+            width, height = max(width // 2, 1), max(height // 2, 1)
+            sizes.append((width, height))
+        return sizes
+    longest = max(size)
+    for target in sorted(set(levels), reverse=True):
+        if 0 < target < longest:
+            sizes.append((max(round(width * target / longest), 1), max(round(height * target / longest), 1)))
+    return sizes
+
+
+def level_dir_for(output_dir, level_size):
+    """The subfolder of output_dir that holds one level, named after its longest side."""
+    return os.path.join(output_dir, str(max(level_size)))
+
+
+def downscale(img, size):
+    """Downscale an Image or ConstantChannel to size.
+
+    Exact integer factors, such as each step of a mip chain, use the box filter of
+    Image.reduce; other sizes are resampled with RESIZE_FILTER.
+    """
+    if isinstance(img, ConstantChannel):
+        return ConstantChannel(img.value, (size[1], size[0]))
+    return resize_input(img, size, RESIZE_FILTER, reduce=True)
+
+
+class _InlineExecutor:
+    """Executor stand-in that runs every task at once on the calling thread."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def _executor(workers):
+    """A thread pool of workers threads, or an _InlineExecutor for workers=0."""
+    workers = int(workers)
+    if workers <= 0:
+        return _InlineExecutor()
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def _remove_outputs(paths, output_dir, remove_dir, level_dirs=()):
+    """Delete the files a cancelled run wrote, and the folders it created."""
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    for path in list(level_dirs) + ([output_dir] if remove_dir else []):
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
+
+
+def generate_texture_set(albedo_path, texture_paths=None, progress=None, write_channels=True,
+                         cancel_event=None, stage_workers=1, cache=None, transforms=None, tracer=None,
+                         encode_profile="default", encode_workers=1, write_constant_channels=True, levels=None,
+                         resize_filters=None, reduce_inputs=False):
+    """Run the full pipeline for one albedo and return the output directory.
+
+    texture_paths maps a suffix from TEXTURE_SUFFIXES to an optional source texture;
+    missing entries are derived from the albedo. The albedo is decoded at most once and
+    every channel, as well as the packed mask, is computed from memory. With
+    write_channels False only the albedo, normal and mask PNGs are written and the
+    emissive, roughness, metallic and specular files are skipped. transforms maps a
+    channel suffix to a mask_map_transforms.ChannelTransform that overrides how it is
+    derived from the albedo (see DEFAULT_TRANSFORMS). Channels without a source or a
+    transform (emissive and metallic by default) are black; they are packed as a
+    ConstantChannel without decoding the albedo, and their files are only written when
+    write_constant_channels is True.
+
+    PNG files are written with the encode_profile settings (see ENCODE_PROFILES) on a
+    pool of encode_workers threads, so encoding overlaps with the remaining stages.
+    PNG sources that need no resizing are copied byte for byte instead.
+
+    Inputs that do not match the albedo size are resized once, on the stage_workers
+    threads, with the filter resize_filters names for their channel (see RESIZE_FILTERS;
+    RESIZE_FILTER by default). With reduce_inputs, exact integer downscales use
+    Image.reduce instead (see resize_input).
+
+    levels adds lower resolution copies of every output, as a list of longest sides or
+    MIP_CHAIN (see level_sizes). Each level is downscaled from the one above it rather
+    than from the sources, and is written with the same file names to a subfolder named
+    after its size (see level_dir_for). Levels are not cached.
+
+    With a mask_map_cache.OutputCache as cache, each stage is keyed on the contents of
+    its inputs and generation_params(); stages found in the cache are restored from it
+    instead of being recomputed, and an unchanged set is not decoded at all.
+
+    progress, if given, is called as progress(step, total_steps, key, **params) after
+    each step, where key names a progress translation. The channel stages are
+    independent and run on up to stage_workers threads. With stage_workers and
+    encode_workers both 0, everything runs on the calling thread, which is what a
+    profiler needs to see the work. If cancel_event (a
+    threading.Event) is set, the run stops before the next stage, removes the files it
+    has written and raises MaskMapCancelled. Other failures are raised as MaskMapError.
+
+    tracer, a mask_map_trace.StageTracer, records the timing, CPU time, byte counts
+    and image size of every decode, resize, derive and encode stage.
+    """
+    texture_paths = texture_paths or {}
+    tracer = tracer or NULL_TRACER
+    save_options = encode_options(encode_profile)
+    filters = {suffix: resize_filter_for(suffix, resize_filters) for suffix in TEXTURE_SUFFIXES}
+    total_steps = 7  # Albedo + 5 textures (emissive, roughness, metallic, specular, normal) + mask map
+    current_step = 0
+
+    def report(key, **params):
+        if progress:
+            progress(current_step, total_steps, key, **params)
+
+    def check_cancelled():
+        if cancel_event is not None and cancel_event.is_set():
+            raise MaskMapCancelled()
+
+    if not albedo_path or not os.path.exists(albedo_path):
+        raise MaskMapError("error_albedo_missing")
+
+    albedo_name = Path(albedo_path).stem
+    output_dir = output_dir_for(albedo_path)
+    created_dir = not os.path.isdir(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    sources = {}
+    for suffix in TEXTURE_SUFFIXES:
+        texture_path = texture_paths.get(suffix)
+        sources[suffix] = texture_path if texture_path and os.path.exists(texture_path) else None
+
+    try:
+        with tracer.stage("albedo.open", input_path=albedo_path) as record:
+            albedo_img = Image.open(albedo_path)
+            albedo_size = albedo_img.size
+            record["width"], record["height"] = albedo_size
+    except Exception as e:
+        raise MaskMapError("error_albedo_read", e) from e
+    level_targets = level_sizes(albedo_size, levels) if levels else []
+    total_steps += len(level_targets)
+    # Full resolution images of every written file, the first level's sources.
+    level_files = {"albedo": albedo_img}
+    level_dirs = []
+
+    gray_lock = threading.Lock()
+    gray_cache = []
+
+    def albedo_gray():
+        """Decode the albedo to grayscale on first use; shared by the stage threads."""
+        with gray_lock:
+            if not gray_cache:
+                with tracer.stage("albedo.grayscale", width=albedo_size[0], height=albedo_size[1]):
+                    gray_cache.append(np.array(albedo_img.convert("L")))
+            return gray_cache[0]
+
+    encoder = _executor(encode_workers)
+    encodes = []
+
+    def encode(name, output_path, save, error_key, key=None, array=None, close=None, **params):
+        """Queue save(output_path) on the encode pool; its cache entry is stored once the file exists."""
+        def task():
+            try:
+                with tracer.stage(f"{name}.encode") as record:
+                    save(output_path)
+                    record["output_path"] = output_path
+                if cache is not None and key is not None:
+                    cache.store(key, output_path, array)
+            finally:
+                if close is not None:
+                    close()
+
+        # list.append is atomic, so stage threads can queue encodes concurrently.
+        written.append(output_path)
+        encodes.append((encoder.submit(task), error_key, params))
+
+    try:
+        stage_keys = {}
+        if cache is not None:
+            try:
+                with tracer.stage("cache.hash"):
+                    albedo_digest = file_digest(albedo_path)
+            except Exception as e:
+                raise MaskMapError("error_albedo_read", e) from e
+            params = generation_params() + (encode_profile,)
+            transform_steps = {suffix: transform.steps for suffix, transform in channel_transforms(transforms).items()}
+            stage_keys["albedo"] = cache_key("albedo", albedo_digest, encode_profile)
+            for suffix, texture_path in sources.items():
+                try:
+                    if texture_path:
+                        stage_keys[suffix] = cache_key(suffix, "copied", file_digest(texture_path), albedo_size, params,
+                                                       int(filters[suffix]), reduce_inputs)
+                    else:
+                        stage_keys[suffix] = cache_key(suffix, "generated", albedo_digest, params, transform_steps.get(suffix))
+                except Exception as e:
+                    raise MaskMapError("error_texture", e, suffix=suffix) from e
+            stage_keys["mask"] = cache_key("mask", *(stage_keys[suffix] for suffix in MASK_CHANNELS))
+
+        try:
+            albedo_output = os.path.join(output_dir, f"{albedo_name}_albedo.png")
+            hit = False
+            if cache is not None:
+                with tracer.stage("albedo.restore") as record:
+                    hit = record["cache_hit"] = cache.restore(stage_keys["albedo"], albedo_output)[0]
+            if hit:
+                written.append(albedo_output)
+            elif can_copy_bytes(albedo_img):
+                with tracer.stage("albedo.copy", input_path=albedo_path):
+                    shutil.copyfile(albedo_path, albedo_output)
+                written.append(albedo_output)
+                if cache is not None:
+                    cache.store(stage_keys["albedo"], albedo_output)
+            else:
+                # Load before any stage thread can touch the image concurrently.
+                with gray_lock, tracer.stage("albedo.decode", width=albedo_size[0], height=albedo_size[1]):
+                    albedo_img.load()
+                encode("albedo", albedo_output, lambda path: albedo_img.save(path, **save_options),
+                       "error_albedo_copy", stage_keys.get("albedo"))
+        except Exception as e:
+            raise MaskMapError("error_albedo_copy", e) from e
+        current_step += 1
+        report("progress_albedo")
+
+        # A cached mask means the channel arrays are not needed, only their files.
+        mask_output = os.path.join(output_dir, f"{albedo_name}_mask.png")
+        try:
+            if cache is not None:
+                with tracer.stage("mask.restore") as record:
+                    mask_cached = record["cache_hit"] = cache.restore(stage_keys["mask"], mask_output)[0]
+            else:
+                mask_cached = False
+        except Exception as e:
+            raise MaskMapError("error_mask", e) from e
+        if mask_cached:
+            written.append(mask_output)
+
+        def process_channel(suffix):
+            """Copy, derive or restore one channel and queue its file; returns (array or None, action)."""
+            check_cancelled()
+            texture_path = sources[suffix]
+            output_path = os.path.join(output_dir, f"{albedo_name}_{suffix}.png")
+            constant = not texture_path and is_constant_channel(suffix, transforms)
+            write = (write_channels and (write_constant_channels or not constant)) or suffix not in MASK_CHANNELS
+            want_array = suffix in MASK_CHANNELS and (not mask_cached or bool(level_targets))
+            action = "copied" if texture_path else "generated"
+            key = stage_keys.get(suffix)
+            if not write and not want_array:
+                return None, action
+
+            if constant:
+                # Cheaper to rebuild than to restore, so the cache is skipped.
+                channel = ConstantChannel(0, (albedo_size[1], albedo_size[0]))
+                if write:
+                    encode(suffix, output_path, lambda path: channel.save(path, encode_profile), "error_texture",
+                           suffix=suffix)
+                    level_files[suffix] = channel
+                return (channel if want_array else None), action
+
+            if cache is not None:
+                with tracer.stage(f"{suffix}.restore") as record:
+                    hit, array = cache.restore(key, output_path if write else None, want_array)
+                    record["cache_hit"] = hit
+                if hit:
+                    if write:
+                        written.append(output_path)
+                        if level_targets:
+                            level_files[suffix] = Image.open(output_path)
+                    return array, action
+
+            if texture_path:
+                img = source = Image.open(texture_path)
+                try:
+                    with tracer.stage(f"{suffix}.decode", input_path=texture_path,
+                                      width=source.width, height=source.height):
+                        source.load()
+                    if source.size != albedo_size:
+                        with tracer.stage(f"{suffix}.resize", width=albedo_size[0], height=albedo_size[1]):
+                            img = resize_input(source, albedo_size, filters[suffix], reduce_inputs)
+                        source.close()
+                    array = np.array(img.convert("L")) if suffix in MASK_CHANNELS else None
+                except Exception:
+                    img.close()
+                    source.close()
+                    raise
+                if write and level_targets:
+                    # Kept open as the first level's source; closed with the other level files.
+                    level_files[suffix] = img
+                if write and img is source and can_copy_bytes(source):
+                    if not level_targets:
+                        img.close()
+                    with tracer.stage(f"{suffix}.copy", input_path=texture_path):
+                        shutil.copyfile(texture_path, output_path)
+                    written.append(output_path)
+                    if cache is not None:
+                        cache.store(key, output_path, array)
+                elif write:
+                    encode(suffix, output_path, lambda path: img.save(path, **save_options),
+                           "error_texture", key, array, close=None if level_targets else img.close, suffix=suffix)
+                else:
+                    img.close()
+                    if cache is not None:
+                        cache.store(key, None, array)
+            else:
+                gray = albedo_gray()
+                with tracer.stage(f"{suffix}.derive", width=albedo_size[0], height=albedo_size[1]):
+                    array = derive_channel(suffix, gray, transforms)
+                if write:
+                    cached_array = array if suffix in MASK_CHANNELS else None
+                    encode(suffix, output_path, lambda path, array=array: save_array(array, path, encode_profile),
+                           "error_texture", key, cached_array, suffix=suffix)
+                    if level_targets:
+                        level_files[suffix] = Image.fromarray(array)
+                elif cache is not None:
+                    cache.store(key, None, array)
+            return (array if want_array else None), action
+
+        channels = {}
+        executor = _executor(stage_workers)
+        futures = {executor.submit(process_channel, suffix): suffix for suffix in TEXTURE_SUFFIXES}
+        try:
+            for future in as_completed(futures):
+                check_cancelled()
+                suffix = futures[future]
+                try:
+                    array, action = future.result()
+                except MaskMapError:
+                    raise
+                except Exception as e:
+                    raise MaskMapError("error_texture", e, suffix=suffix) from e
+                if array is not None:
+                    channels[suffix] = array
+                current_step += 1
+                if suffix == "normal":
+                    report("progress_normal", action=action)
+                else:
+                    report("progress_copy" if action == "copied" else "progress_generate", suffix=suffix)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        check_cancelled()
+        report("progress_mask")
+        if not mask_cached:
+            try:
+                with tracer.stage("mask.pack", width=albedo_size[0], height=albedo_size[1]):
+                    mask_map = pack_mask_map(*(channels[suffix] for suffix in MASK_CHANNELS))
+            except Exception as e:
+                raise MaskMapError("error_mask", e) from e
+            encode("mask", mask_output, lambda path: save_array(mask_map, path, encode_profile),
+                   "error_mask", stage_keys.get("mask"))
+
+        if level_targets:
+            # Mask channels share the written file's image when it holds the same L pixels.
+            mask_sources = {}
+            for suffix in MASK_CHANNELS:
+                source = level_files.get(suffix)
+                if source is None or not (isinstance(source, ConstantChannel) or source.mode == "L"):
+                    channel = channels[suffix]
+                    source = channel if isinstance(channel, ConstantChannel) else Image.fromarray(channel)
+                mask_sources[suffix] = source
+            file_sources = {name: level_files[name] for name in ("albedo",) + TEXTURE_SUFFIXES if name in level_files}
+            level_error_keys = dict(dict.fromkeys(TEXTURE_SUFFIXES, "error_texture"), albedo="error_albedo_copy")
+
+        for level_size in level_targets:
+            check_cancelled()
+            level_dir = level_dir_for(output_dir, level_size)
+            if not os.path.isdir(level_dir):
+                os.makedirs(level_dir)
+                level_dirs.insert(0, level_dir)
+            scaled = {}
+
+            def scale(name, source):
+                # Keyed on the source object, so an image shared by a file and the mask is scaled once.
+                if id(source) not in scaled:
+                    try:
+                        with tracer.stage(f"{name}.level", width=level_size[0], height=level_size[1]):
+                            scaled[id(source)] = downscale(source, level_size)
+                    except Exception as e:
+                        raise MaskMapError(level_error_keys[name], e, suffix=name) from e
+                return scaled[id(source)]
+
+            next_files = {name: scale(name, source) for name, source in file_sources.items()}
+            mask_sources = {suffix: scale(suffix, source) for suffix, source in mask_sources.items()}
+            for name, img in next_files.items():
+                encode(f"{name}.level", os.path.join(level_dir, f"{albedo_name}_{name}.png"),
+                       lambda path, img=img: save_image(img, path, encode_profile), level_error_keys[name], suffix=name)
+            try:
+                level_channels = [mask_sources[suffix] for suffix in MASK_CHANNELS]
+                with tracer.stage("mask.level", width=level_size[0], height=level_size[1]):
+                    level_mask = pack_mask_map(*(channel if isinstance(channel, ConstantChannel) else np.asarray(channel)
+                                                 for channel in level_channels))
+            except Exception as e:
+                raise MaskMapError("error_mask", e) from e
+            encode("mask.level", os.path.join(level_dir, f"{albedo_name}_mask.png"),
+                   lambda path, level_mask=level_mask: save_array(level_mask, path, encode_profile), "error_mask")
+            file_sources = next_files
+            current_step += 1
+            report("progress_level", size=f"{level_size[0]}x{level_size[1]}")
+
+        for future, error_key, params in encodes:
+            try:
+                future.result()
+            except Exception as e:
+                raise MaskMapError(error_key, e, **params) from e
+        current_step += 1
+        report("progress_complete")
+    except MaskMapCancelled:
+        encoder.shutdown(wait=True, cancel_futures=True)
+        _remove_outputs(written, output_dir, created_dir, level_dirs)
+        raise
+    finally:
+        encoder.shutdown(wait=True, cancel_futures=True)
+        for img in level_files.values():
+            if not isinstance(img, ConstantChannel):
+                img.close()
+    return output_dir
@@ -1,10 +1,31 @@
 import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from pathlib import Path
-from PIL import Image, ImageTk, ImageEnhance
-import webbrowser
-import numpy as np
+
+# NumPy, Pillow, the pipeline and webbrowser are imported where they are first used,
+# so the window opens without waiting for them.
+
+POLL_INTERVAL_MS = 50
+STAGE_WORKERS = 3  # roughness, specular and normal can be derived side by side
+ENCODE_WORKERS = 2  # PNG files are written while the remaining channels are derived
+HOMEPAGE_URL = "https://meringue-rouge.github.io/"
+LOGO_MAX_WIDTH = 100
+PREVIEW_DELAY_MS = 120  # wait for typing or slider drags to pause before re-rendering
+PREVIEW_SIZE = 192
+PREVIEW_THUMB_SIZE = 64
+PREVIEW_CHANNELS = ("emissive", "roughness", "metallic", "specular", "normal")
+# Same defaults as mask_map_core.ROUGHNESS_CONTRAST / SPECULAR_CONTRAST, repeated so
+# that startup does not import the pipeline.
+DEFAULT_ROUGHNESS_CONTRAST = 1.5
+DEFAULT_SPECULAR_CONTRAST = 2.0
+
+
+def open_homepage(event=None):
+    import webbrowser
+    webbrowser.open_new(HOMEPAGE_URL)
+
 
 class BakinMaskMapGeneratorApp:
     def __init__(self, root):
@@ -23,6 +44,8 @@ class BakinMaskMapGeneratorApp:
                 "metallic_label": "Select Metallic Texture (Optional):",
                 "specular_label": "Select Specular Texture (Optional):",
                 "normal_label": "Select Normal Texture (Optional):",
+                "levels_label": "Also write lower resolutions (longest side in px, e.g. 1024 512):",
+                "mip_chain_label": "Write a full mip chain instead",
                 "generate_button": "Generate Mask Map and Textures",
                 "progress_label": "Progress:",
                 "progress_start": "Starting...",
@@ -31,11 +54,21 @@ class BakinMaskMapGeneratorApp:
                 "progress_generate": "Generated {suffix} texture",
                 "progress_normal": "{action} normal texture",
                 "progress_mask": "Creating mask map",
+                "progress_level": "Wrote {size} level",
                 "progress_complete": "Completed",
+                "progress_cancelling": "Cancelling...",
+                "progress_cancelled": "Cancelled",
+                "cancel_button": "Cancel",
+                "preview_label": "Preview:",
+                "preview_hint": "Select an albedo texture to see a preview.",
+                "preview_error": "Preview failed: {error}",
+                "roughness_contrast_label": "Roughness contrast:",
+                "specular_contrast_label": "Specular contrast:",
                 "footer_notice": "This application uses Pillow and NumPy for image processing.",
                 "footer_link": "Made by Meringue Rouge",
                 "language_button": "日本語",
                 "error_albedo_missing": "Please select a valid albedo texture.",
+                "error_levels": "Lower resolutions must be positive whole numbers of pixels, e.g. 1024 512.",
                 "error_albedo_read": "Failed to read albedo texture: {error}",
                 "error_albedo_copy": "Failed to copy albedo texture: {error}",
                 "error_texture": "Failed to process {suffix} texture: {error}",
@@ -51,6 +84,8 @@ class BakinMaskMapGeneratorApp:
                 "metallic_label": "メタリックテクスチャを選択（任意）：",
                 "specular_label": "スペキュラテクスチャを選択（任意）：",
                 "normal_label": "ノーマルテクスチャを選択（任意）：",
+                "levels_label": "低解像度版も書き出す（長辺のpx、例：1024 512）：",
+                "mip_chain_label": "代わりにミップチェーンをすべて書き出す",
                 "generate_button": "マスクマップとテクスチャを生成",
                 "progress_label": "進行状況：",
                 "progress_start": "開始中...",
@@ -59,11 +94,21 @@ class BakinMaskMapGeneratorApp:
                 "progress_generate": "{suffix}テクスチャを生成しました",
                 "progress_normal": "ノーマルテクスチャを{action}",
                 "progress_mask": "マスクマップを作成中",
+                "progress_level": "{size}レベルを書き出しました",
                 "progress_complete": "完了",
+                "progress_cancelling": "キャンセル中...",
+                "progress_cancelled": "キャンセルしました",
+                "cancel_button": "キャンセル",
+                "preview_label": "プレビュー：",
+                "preview_hint": "アルベドテクスチャを選択するとプレビューが表示されます。",
+                "preview_error": "プレビューに失敗しました：{error}",
+                "roughness_contrast_label": "ラフネスのコントラスト：",
+                "specular_contrast_label": "スペキュラのコントラスト：",
                 "footer_notice": "このアプリケーションはPillowとNumPyを使用して画像処理を行います。",
                 "footer_link": "Meringue Rouge 製作",
                 "language_button": "English",
                 "error_albedo_missing": "有効なアルベドテクスチャを選択してください。",
+                "error_levels": "低解像度版のサイズは正の整数（px）で指定してください。例：1024 512",
                 "error_albedo_read": "アルベドテクスチャの読み込みに失敗しました：{error}",
                 "error_albedo_copy": "アルベドテクスチャのコピーに失敗しました：{error}",
                 "error_texture": "{suffix}テクスチャの処理に失敗しました：{error}",
@@ -80,13 +125,17 @@ class BakinMaskMapGeneratorApp:
         self.metallic_path = tk.StringVar()
         self.specular_path = tk.StringVar()
         self.normal_path = tk.StringVar()
+        self.roughness_contrast = tk.DoubleVar(value=DEFAULT_ROUGHNESS_CONTRAST)
+        self.specular_contrast = tk.DoubleVar(value=DEFAULT_SPECULAR_CONTRAST)
+        self.levels_text = tk.StringVar()
+        self.mip_chain = tk.BooleanVar(value=False)
 
         # Style
         padding_opts = {'padx': 10, 'pady': 5}
 
         # Main frame
         self.main_frame = ttk.Frame(self.root)
-        self.main_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        self.main_frame.pack(side="left", fill="both", expand=True, padx=10, pady=10)
 
         # Language toggle button
         self.widgets = {}
@@ -133,9 +182,25 @@ class BakinMaskMapGeneratorApp:
         ttk.Entry(self.main_frame, textvariable=self.normal_path, width=50).pack(**padding_opts)
         ttk.Button(self.main_frame, text="Browse", command=lambda: self.browse_file(self.normal_path)).pack(**padding_opts)
 
+        # Lower resolution levels
+        self.widgets["levels_label"] = ttk.Label(self.main_frame, text=self.translations["en"]["levels_label"])
+        self.widgets["levels_label"].pack(anchor="w", **padding_opts)
+        self.levels_entry = ttk.Entry(self.main_frame, textvariable=self.levels_text, width=50)
+        self.levels_entry.pack(**padding_opts)
+        self.widgets["mip_chain_label"] = ttk.Checkbutton(self.main_frame, text=self.translations["en"]["mip_chain_label"],
+                                                          variable=self.mip_chain, command=self.toggle_mip_chain)
+        self.widgets["mip_chain_label"].pack(anchor="w", **padding_opts)
+
         # Generate button
         self.generate_button = ttk.Button(self.main_frame, text=self.translations["en"]["generate_button"], command=self.generate_mask_map)
         self.generate_button.pack(pady=10)
+        self.widgets["cancel_button"] = ttk.Button(self.main_frame, text=self.translations["en"]["cancel_button"], command=self.cancel_generation, state="disabled")
+        self.widgets["cancel_button"].pack()
+
+        # Background generation state
+        self.worker = None
+        self.cancel_event = threading.Event()
+        self.events = queue.Queue()
 
         # Progress bar and label
         self.widgets["progress_label"] = ttk.Label(self.main_frame, text=self.translations["en"]["progress_label"])
@@ -155,37 +220,79 @@ class BakinMaskMapGeneratorApp:
         # Left side: Creator link
         self.widgets["footer_link"] = ttk.Label(footer_frame, text=self.translations["en"]["footer_link"], foreground="blue", cursor="hand2")
         self.widgets["footer_link"].pack(side="left", padx=10)
-        self.widgets["footer_link"].bind("<Button-1>", lambda e: webbrowser.open_new("https://meringue-rouge.github.io/"))
+        self.widgets["footer_link"].bind("<Button-1>", open_homepage)
 
-        # Right side: Placeholder for logo (optional)
+        # Right side: logo (optional), loaded once the window is up
         self.logo_image = None
-        logo_path = os.path.join(os.path.dirname(__file__), "software_logo.png")
-        if os.path.exists(logo_path):
-            try:
-                raw_logo = Image.open(logo_path)
-                max_logo_width = 100
-                aspect_ratio = raw_logo.height / raw_logo.width
-                scaled_width = min(raw_logo.width, max_logo_width)
-                scaled_height = int(scaled_width * aspect_ratio)
-                logo_resized = raw_logo.resize((scaled_width, scaled_height), Image.LANCZOS)
-                self.logo_image = ImageTk.PhotoImage(logo_resized)
-                logo_label = tk.Label(footer_frame, image=self.logo_image, cursor="hand2", borderwidth=0)
-                logo_label.pack(side="right", anchor="se", padx=10, pady=5)
-                logo_label.bind("<Button-1>", lambda e: webbrowser.open_new("https://meringue-rouge.github.io/"))
-                raw_logo.close()
-            except Exception as e:
-                print(f"Error loading logo: {e}")
+        self.root.after_idle(self.load_logo, footer_frame)
 
         # Notice centered
         self.widgets["footer_notice"] = ttk.Label(self.main_frame, text=self.translations["en"]["footer_notice"], font=("Arial", 8))
         self.widgets["footer_notice"].pack(pady=10)
 
+        # Preview panel: the packed mask and each channel, rendered from small proxies
+        self.preview_frame = ttk.Frame(self.root)
+        self.preview_frame.pack(side="left", fill="y", padx=10, pady=10)
+        self.widgets["preview_label"] = ttk.Label(self.preview_frame, text=self.translations["en"]["preview_label"])
+        self.widgets["preview_label"].pack(anchor="w", **padding_opts)
+        # Blank Tk images reserve the preview's space before Pillow is loaded.
+        self.preview_blank = tk.PhotoImage(width=PREVIEW_SIZE, height=PREVIEW_SIZE)
+        self.preview_thumb_blank = tk.PhotoImage(width=PREVIEW_THUMB_SIZE, height=PREVIEW_THUMB_SIZE)
+        self.preview_images = {}
+        self.preview_labels = {"mask": tk.Label(self.preview_frame, image=self.preview_blank, borderwidth=0)}
+        self.preview_labels["mask"].pack(**padding_opts)
+        ttk.Label(self.preview_frame, text="mask").pack()
+        thumbs_frame = ttk.Frame(self.preview_frame)
+        thumbs_frame.pack(**padding_opts)
+        for column, suffix in enumerate(PREVIEW_CHANNELS):
+            self.preview_labels[suffix] = tk.Label(thumbs_frame, image=self.preview_thumb_blank, borderwidth=0)
+            self.preview_labels[suffix].grid(row=0, column=column, padx=2)
+            ttk.Label(thumbs_frame, text=suffix, font=("Arial", 8)).grid(row=1, column=column)
+        self.preview_status = ttk.Label(self.preview_frame, text=self.translations["en"]["preview_hint"], wraplength=PREVIEW_SIZE * 2)
+        self.preview_status.pack(anchor="w", **padding_opts)
+        for key, variable in (("roughness_contrast_label", self.roughness_contrast),
+                              ("specular_contrast_label", self.specular_contrast)):
+            self.widgets[key] = ttk.Label(self.preview_frame, text=self.translations["en"][key])
+            self.widgets[key].pack(anchor="w", **padding_opts)
+            tk.Scale(self.preview_frame, variable=variable, from_=0.0, to=4.0, resolution=0.1, orient="horizontal",
+                     length=PREVIEW_SIZE * 2).pack(**padding_opts)
+
+        # Background preview state
+        self.preview_job = None
+        self.preview_generation = 0
+        self.preview_worker = None
+        self.preview_results = queue.Queue()
+        for variable in (self.albedo_path, self.emissive_path, self.roughness_path, self.metallic_path,
+                         self.specular_path, self.normal_path, self.roughness_contrast, self.specular_contrast):
+            variable.trace_add("write", self.schedule_preview)
+
         # Update window size
+        self.fit_window()
+
+    def fit_window(self):
+        """Size the window to fit the form and the preview panel."""
         self.root.update_idletasks()
-        window_width = max(450, self.main_frame.winfo_reqwidth() + 20)
-        window_height = self.main_frame.winfo_reqheight() + 20
+        window_width = max(450, self.main_frame.winfo_reqwidth() + self.preview_frame.winfo_reqwidth() + 40)
+        window_height = max(self.main_frame.winfo_reqheight(), self.preview_frame.winfo_reqheight()) + 20
         self.root.geometry(f"{window_width}x{window_height}")
 
+    def load_logo(self, footer_frame):
+        """Decode and show the footer logo; scheduled after startup because it needs Pillow."""
+        logo_path = os.path.join(os.path.dirname(__file__), "software_logo.png")
+        if not os.path.exists(logo_path):
+            return
+        try:
+            from PIL import Image, ImageTk
+            with Image.open(logo_path) as raw_logo:
+                raw_logo.thumbnail((LOGO_MAX_WIDTH, raw_logo.height))
+                self.logo_image = ImageTk.PhotoImage(raw_logo)
+            logo_label = tk.Label(footer_frame, image=self.logo_image, cursor="hand2", borderwidth=0)
+            logo_label.pack(side="right", anchor="se", padx=10, pady=5)
+            logo_label.bind("<Button-1>", open_homepage)
+            self.fit_window()
+        except Exception as e:
+            print(f"Error loading logo: {e}")
+
     def toggle_language(self):
         """Toggle between English and Japanese UI text."""
         new_lang = "ja" if self.language.get() == "en" else "en"
@@ -195,218 +302,192 @@ class BakinMaskMapGeneratorApp:
         for key, widget in self.widgets.items():
             if key != "language_button" and "{suffix}" not in self.translations[new_lang][key] and "{action}" not in self.translations[new_lang][key]:
                 widget.configure(text=self.translations[new_lang][key])
-        self.root.update_idletasks()
-        window_width = max(450, self.main_frame.winfo_reqwidth() + 20)
-        window_height = self.main_frame.winfo_reqheight() + 20
-        self.root.geometry(f"{window_width}x{window_height}")
+        if not self.preview_images:
+            self.preview_status.configure(text=self.translations[new_lang]["preview_hint"])
+        self.fit_window()
+
+    def toggle_mip_chain(self):
+        """A mip chain includes every level, so the size list is disabled while it is selected."""
+        self.levels_entry["state"] = "disabled" if self.mip_chain.get() else "normal"
+
+    def parse_levels(self):
+        """The longest sides typed into the levels field, or None unless all are positive integers."""
+        try:
+            sizes = [int(value) for value in self.levels_text.get().replace(",", " ").split()]
+        except ValueError:
+            return None
+        return sizes if all(size > 0 for size in sizes) else None
 
     def browse_file(self, path_var):
         file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.png *.jpg *.jpeg *.tga *.bmp")])
         if file_path:
             path_var.set(file_path)
 
-    def generate_normal_map(self, albedo_path, output_path):
-        """Generate a simple normal map from the albedo texture using Sobel edge detection."""
-        try:
-            albedo = Image.open(albedo_path).convert("L")
-            albedo_array = np.array(albedo)
-            height, width = albedo_array.shape
-
-            sobel_x = np.array([[1, 0, -1], [2, 0, -2], [1, 0, -1]])
-            sobel_y = np.array([[1, 2, 1], [0, 0, 0], [-1, -2, -1]])
-            
-            grad_x = np.zeros_like(albedo_array, dtype=float)
-            grad_y = np.zeros_like(albedo_array, dtype=float)
-            
-            for i in range(1, height-1):
-                for j in range(1, width-1):
-                    grad_x[i, j] = np.sum(albedo_array[i-1:i+2, j-1:j+2] * sobel_x)
-                    grad_y[i, j] = np.sum(albedo_array[i-1:i+2, j-1:j+2] * sobel_y)
-            
-            grad_x = (grad_x / np.max(np.abs(grad_x)) * 127.5 + 127.5).astype(np.uint8)
-            grad_y = (grad_y / np.max(np.abs(grad_y)) * 127.5 + 127.5).astype(np.uint8)
-            normal_z = np.ones_like(grad_x) * 255
-            
-            normal_map = np.stack([grad_x, grad_y, normal_z], axis=-1)
-            normal_img = Image.fromarray(normal_map, "RGB")
-            normal_img.save(output_path)
-            normal_img.close()
-            albedo.close()
-        except Exception as e:
-            messagebox.showerror("Error", self.translations[self.language.get()]["error_normal"].format(error=str(e)))
-            raise
-
-    def generate_roughness_map(self, albedo_path, output_path):
-        """Generate a roughness map from the albedo (inverted grayscale with contrast)."""
-        try:
-            albedo = Image.open(albedo_path).convert("L")
-            inverted = Image.eval(albedo, lambda x: 255 - x)
-            enhancer = ImageEnhance.Contrast(inverted)
-            roughness = enhancer.enhance(1.5)
-            roughness.save(output_path)
-            albedo.close()
-            inverted.close()
-            roughness.close()
-        except Exception as e:
-            messagebox.showerror("Error", self.translations[self.language.get()]["error_texture"].format(suffix="roughness", error=str(e)))
-            raise
-
-    def generate_specular_map(self, albedo_path, output_path):
-        """Generate a specular map from the albedo (grayscale with high contrast)."""
-        try:
-            albedo = Image.open(albedo_path).convert("L")
-            enhancer = ImageEnhance.Contrast(albedo)
-            specular = enhancer.enhance(2.0)
-            specular.save(output_path)
-            albedo.close()
-            specular.close()
-        except Exception as e:
-            messagebox.showerror("Error", self.translations[self.language.get()]["error_texture"].format(suffix="specular", error=str(e)))
-            raise
-
-    def create_mask_map(self, emissive_path, roughness_path, metallic_path, specular_path, output_path, albedo_size):
-        """Create a Bakin mask map with emissive (R), roughness (G), metallic (B), and specular (A)."""
-        width, height = albedo_size
-        default_img = Image.new("L", (width, height), 0)
-
-        try:
-            emissive = Image.open(emissive_path).convert("L") if emissive_path and os.path.exists(emissive_path) else default_img.copy()
-            roughness = Image.open(roughness_path).convert("L") if roughness_path and os.path.exists(roughness_path) else default_img.copy()
-            metallic = Image.open(metallic_path).convert("L") if metallic_path and os.path.exists(metallic_path) else default_img.copy()
-            specular = Image.open(specular_path).convert("L") if specular_path and os.path.exists(specular_path) else default_img.copy()
-
-            if emissive.size != albedo_size:
-                emissive = emissive.resize(albedo_size, Image.LANCZOS)
-            if roughness.size != albedo_size:
-                roughness = roughness.resize(albedo_size, Image.LANCZOS)
-            if metallic.size != albedo_size:
-                metallic = metallic.resize(albedo_size, Image.LANCZOS)
-            if specular.size != albedo_size:
-                specular = specular.resize(albedo_size, Image.LANCZOS)
-
-            mask_map = Image.new("RGBA", albedo_size)
-            mask_map_array = np.array(mask_map)
-
-            mask_map_array[..., 0] = np.array(emissive)
-            mask_map_array[..., 1] = np.array(roughness)
-            mask_map_array[..., 2] = np.array(metallic)
-            mask_map_array[..., 3] = np.array(specular)
-
-            mask_map = Image.fromarray(mask_map_array, "RGBA")
-            mask_map.save(output_path)
-
-            emissive.close()
-            roughness.close()
-            metallic.close()
-            specular.close()
-            mask_map.close()
-            default_img.close()
-        except Exception as e:
-            messagebox.showerror("Error", self.translations[self.language.get()]["error_mask"])
-            return False
-        return True
-
     def generate_mask_map(self):
+        """Start the pipeline on a worker thread; results come back through self.events."""
         albedo_path = self.albedo_path.get()
-        emissive_path = self.emissive_path.get()
-        roughness_path = self.roughness_path.get()
-        metallic_path = self.metallic_path.get()
-        specular_path = self.specular_path.get()
-        normal_path = self.normal_path.get()
+        texture_paths = {
+            "emissive": self.emissive_path.get(),
+            "roughness": self.roughness_path.get(),
+            "metallic": self.metallic_path.get(),
+            "specular": self.specular_path.get(),
+            "normal": self.normal_path.get(),
+        }
 
         if not albedo_path or not os.path.exists(albedo_path):
             messagebox.showerror("Error", self.translations[self.language.get()]["error_albedo_missing"])
             return
+        level_sizes = [] if self.mip_chain.get() else self.parse_levels()
+        if level_sizes is None:
+            messagebox.showerror("Error", self.translations[self.language.get()]["error_levels"])
+            return
+        if self.worker is not None:
+            return
 
         self.generate_button["state"] = "disabled"
+        self.widgets["cancel_button"]["state"] = "normal"
         self.progress["value"] = 0
         self.progress_label["text"] = self.translations[self.language.get()]["progress_start"]
-        self.root.update()
-
-        total_steps = 7  # Albedo + 5 textures (emissive, roughness, metallic, specular, normal) + mask map
-        step_increment = 100.0 / total_steps
-        current_step = 0
-
-        albedo_name = Path(albedo_path).stem
-        output_dir = os.path.join(os.path.dirname(albedo_path), f"{albedo_name}_bakin_textures")
-        os.makedirs(output_dir, exist_ok=True)
 
+        self.cancel_event.clear()
+        self.roughness_contrast_value = self.roughness_contrast.get()
+        self.specular_contrast_value = self.specular_contrast.get()
+        self.level_sizes_value = level_sizes
+        self.mip_chain_value = self.mip_chain.get()
+        self.worker = threading.Thread(target=self.run_generation, args=(albedo_path, texture_paths), daemon=True)
+        self.worker.start()
+        self.root.after(POLL_INTERVAL_MS, self.poll_events)
+
+    def run_generation(self, albedo_path, texture_paths):
+        """Worker thread body. Never touches Tk; everything goes through self.events."""
         try:
-            albedo_img = Image.open(albedo_path)
-            albedo_size = albedo_img.size
-            albedo_img.close()
+            from mask_map_core import MIP_CHAIN, MaskMapCancelled, MaskMapError, contrast_transforms, generate_texture_set
         except Exception as e:
-            messagebox.showerror("Error", self.translations[self.language.get()]["error_albedo_read"].format(error=str(e)))
-            self.generate_button["state"] = "normal"
+            self.events.put(("error", "error_mask", {"error": str(e)}))
             return
 
+        def progress(step, total_steps, key, **params):
+            self.events.put(("progress", step * 100.0 / total_steps, key, params))
+
         try:
-            albedo_output = os.path.join(output_dir, f"{albedo_name}_albedo.png")
-            Image.open(albedo_path).save(albedo_output)
-            current_step += 1
-            self.progress["value"] = current_step * step_increment
-            self.progress_label["text"] = self.translations[self.language.get()]["progress_albedo"]
-            self.root.update()
+            transforms = contrast_transforms(self.roughness_contrast_value, self.specular_contrast_value)
+            levels = MIP_CHAIN if self.mip_chain_value else self.level_sizes_value or None
+            output_dir = generate_texture_set(albedo_path, texture_paths, progress=progress,
+                                              cancel_event=self.cancel_event, stage_workers=STAGE_WORKERS,
+                                              encode_workers=ENCODE_WORKERS, transforms=transforms, levels=levels)
+        except MaskMapCancelled:
+            self.events.put(("cancelled",))
+        except MaskMapError as e:
+            self.events.put(("error", e.key, e.params))
         except Exception as e:
-            messagebox.showerror("Error", self.translations[self.language.get()]["error_albedo_copy"].format(error=str(e)))
-            self.generate_button["state"] = "normal"
-            return
+            self.events.put(("error", "error_mask", {"error": str(e)}))
+        else:
+            self.events.put(("done", output_dir))
 
-        texture_configs = [
-            (emissive_path, "emissive", lambda p, o: Image.new("L", albedo_size, 0).save(o)),
-            (roughness_path, "roughness", self.generate_roughness_map),
-            (metallic_path, "metallic", lambda p, o: Image.new("L", albedo_size, 0).save(o)),
-            (specular_path, "specular", self.generate_specular_map),
-            (normal_path, "normal", self.generate_normal_map)
-        ]
+    def cancel_generation(self):
+        self.cancel_event.set()
+        self.widgets["cancel_button"]["state"] = "disabled"
+        self.progress_label["text"] = self.translations[self.language.get()]["progress_cancelling"]
 
-        for texture_path, suffix, generate_func in texture_configs:
-            output_path = os.path.join(output_dir, f"{albedo_name}_{suffix}.png")
+    def poll_events(self):
+        """Apply queued worker events on the Tk thread, then reschedule while the worker runs."""
+        translations = self.translations[self.language.get()]
+        while True:
             try:
-                if texture_path and os.path.exists(texture_path):
-                    img = Image.open(texture_path)
-                    if img.size != albedo_size:
-                        img = img.resize(albedo_size, Image.LANCZOS)
-                    img.save(output_path)
-                    img.close()
-                    self.progress_label["text"] = self.translations[self.language.get()]["progress_copy"].format(suffix=suffix)
-                    if suffix == "normal":
-                        self.progress_label["text"] = self.translations[self.language.get()]["progress_normal"].format(action="copied")
-                else:
-                    generate_func(albedo_path, output_path)
-                    self.progress_label["text"] = self.translations[self.language.get()]["progress_generate"].format(suffix=suffix)
-                    if suffix == "normal":
-                        self.progress_label["text"] = self.translations[self.language.get()]["progress_normal"].format(action="generated")
-                current_step += 1
-                self.progress["value"] = current_step * step_increment
-                self.root.update()
-            except Exception as e:
-                messagebox.showerror("Error", self.translations[self.language.get()]["error_texture"].format(suffix=suffix, error=str(e)))
-                self.generate_button["state"] = "normal"
-                return
-
-        mask_output = os.path.join(output_dir, f"{albedo_name}_mask.png")
-        self.progress_label["text"] = self.translations[self.language.get()]["progress_mask"]
-        self.root.update()
-        success = self.create_mask_map(
-            os.path.join(output_dir, f"{albedo_name}_emissive.png"),
-            os.path.join(output_dir, f"{albedo_name}_roughness.png"),
-            os.path.join(output_dir, f"{albedo_name}_metallic.png"),
-            os.path.join(output_dir, f"{albedo_name}_specular.png"),
-            mask_output,
-            albedo_size
-        )
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            kind = event[0]
+            if kind == "progress":
+                _, value, key, params = event
+                self.progress["value"] = value
+                if not self.cancel_event.is_set():
+                    self.progress_label["text"] = translations[key].format(**params)
+                continue
+
+            self.worker = None
+            self.generate_button["state"] = "normal"
+            self.widgets["cancel_button"]["state"] = "disabled"
+            if kind == "done":
+                messagebox.showinfo("Success", translations["success_message"].format(output_dir=event[1]))
+                self.root.quit()
+            elif kind == "cancelled":
+                self.progress["value"] = 0
+                self.progress_label["text"] = translations["progress_cancelled"]
+            else:
+                messagebox.showerror("Error", translations[event[1]].format(**event[2]))
+            return
+        self.root.after(POLL_INTERVAL_MS, self.poll_events)
 
-        if success:
-            current_step += 1
-            self.progress["value"] = current_step * step_increment
-            self.progress_label["text"] = self.translations[self.language.get()]["progress_complete"]
-            self.root.update()
-            messagebox.showinfo("Success", self.translations[self.language.get()]["success_message"].format(output_dir=output_dir))
-            self.root.quit()
+    def schedule_preview(self, *args):
+        """Re-render the preview once the inputs have stopped changing for PREVIEW_DELAY_MS."""
+        if self.preview_job is not None:
+            self.root.after_cancel(self.preview_job)
+        self.preview_job = self.root.after(PREVIEW_DELAY_MS, self.start_preview)
+
+    def start_preview(self):
+        """Render the preview on a worker thread; stale results are dropped by generation number."""
+        self.preview_job = None
+        albedo_path = self.albedo_path.get()
+        if not albedo_path or not os.path.exists(albedo_path):
+            return
+        texture_paths = {
+            "emissive": self.emissive_path.get(),
+            "roughness": self.roughness_path.get(),
+            "metallic": self.metallic_path.get(),
+            "specular": self.specular_path.get(),
+            "normal": self.normal_path.get(),
+        }
+        try:
+            contrasts = (self.roughness_contrast.get(), self.specular_contrast.get())
+        except tk.TclError:  # the slider's variable is briefly empty while typing
+            return
+        self.preview_generation += 1
+        polling = self.preview_worker is not None and self.preview_worker.is_alive()
+        self.preview_worker = threading.Thread(target=self.run_preview,
+                                               args=(self.preview_generation, albedo_path, texture_paths, contrasts),
+                                               daemon=True)
+        self.preview_worker.start()
+        if not polling:
+            self.root.after(POLL_INTERVAL_MS, self.poll_preview)
+
+    def run_preview(self, generation, albedo_path, texture_paths, contrasts):
+        """Preview worker thread body; results go through self.preview_results."""
+        try:
+            from mask_map_core import contrast_transforms
+            from mask_map_preview import render_preview
+            channels = render_preview(albedo_path, texture_paths, contrast_transforms(*contrasts), PREVIEW_SIZE)
+        except Exception as e:
+            self.preview_results.put((generation, None, str(e)))
         else:
-            messagebox.showerror("Error", self.translations[self.language.get()]["error_mask"])
-        self.generate_button["state"] = "normal"
+            self.preview_results.put((generation, channels, None))
+
+    def poll_preview(self):
+        """Show the newest preview result on the Tk thread."""
+        latest = None
+        while True:
+            try:
+                latest = self.preview_results.get_nowait()
+            except queue.Empty:
+                break
+        if latest is not None and latest[0] == self.preview_generation:
+            self.show_preview(*latest[1:])
+        if self.preview_worker.is_alive() or not self.preview_results.empty():
+            self.root.after(POLL_INTERVAL_MS, self.poll_preview)
+
+    def show_preview(self, channels, error):
+        translations = self.translations[self.language.get()]
+        if error is not None:
+            self.preview_status["text"] = translations["preview_error"].format(error=error)
+            return
+        from PIL import Image, ImageTk
+        for name, label in self.preview_labels.items():
+            img = Image.fromarray(channels[name])
+            if name != "mask":
+                img.thumbnail((PREVIEW_THUMB_SIZE, PREVIEW_THUMB_SIZE))
+            self.preview_images[name] = ImageTk.PhotoImage(img)
+            label.configure(image=self.preview_images[name])
+        self.preview_status["text"] = ""
 
 if __name__ == "__main__":
     root = tk.Tk()
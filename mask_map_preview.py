@@ -0,0 +1,64 @@
+"""Fast previews of a texture set from small cached proxies of its textures.
+
+Each texture is decoded once at preview size (Image.thumbnail lets JPEG decode at a
+reduced scale and reduces other formats before resampling) and kept in a small cache
+keyed on its path and modification time. render_preview then runs the channel
+derivation and packing of mask_map_core on those proxies, which takes milliseconds, so
+the preview can be redrawn whenever an input or a parameter changes.
+
+Contrast uses the mean of the proxy and the normal map is normalised by the proxy's
+largest gradient, so the preview is close to, but not exactly, the full-resolution
+output.
+"""
+import os
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+from mask_map_core import MASK_CHANNELS, TEXTURE_SUFFIXES, ConstantChannel, derive_channel, pack_mask_map
+
+PREVIEW_SIZE = 192
+PROXY_CACHE_SIZE = 16
+# Proxies only need to line up with the albedo proxy, so a cheap filter is enough.
+PROXY_RESIZE_FILTER = Image.BILINEAR
+
+
+@lru_cache(maxsize=PROXY_CACHE_SIZE)
+def _load_proxy(path, mtime_ns, max_size):
+    with Image.open(path) as img:
+        img.thumbnail((max_size, max_size))
+        return img.copy()
+
+
+def load_proxy(path, max_size=PREVIEW_SIZE):
+    """The texture at path downscaled to fit max_size; cached until the file changes.
+
+    The returned image is shared between callers and must not be modified.
+    """
+    return _load_proxy(path, os.stat(path).st_mtime_ns, max_size)
+
+
+def render_preview(albedo_path, texture_paths=None, transforms=None, max_size=PREVIEW_SIZE):
+    """Return {"mask": RGBA array, suffix: array, ...} for a texture set, computed from proxies.
+
+    texture_paths and transforms work as in mask_map_core.generate_texture_set.
+    """
+    texture_paths = texture_paths or {}
+    albedo = load_proxy(albedo_path, max_size)
+    gray = np.array(albedo.convert("L"))
+    channels = {}
+    for suffix in TEXTURE_SUFFIXES:
+        texture_path = texture_paths.get(suffix)
+        if texture_path and os.path.exists(texture_path):
+            proxy = load_proxy(texture_path, max_size).convert("RGB" if suffix == "normal" else "L")
+            if proxy.size != albedo.size:
+                proxy = proxy.resize(albedo.size, PROXY_RESIZE_FILTER)
+            channels[suffix] = np.array(proxy)
+        else:
+            channels[suffix] = derive_channel(suffix, gray, transforms)
+    channels["mask"] = pack_mask_map(*(channels[suffix] for suffix in MASK_CHANNELS))
+    for name, channel in channels.items():
+        if isinstance(channel, ConstantChannel):
+            channels[name] = channel.to_array()
+    return channels
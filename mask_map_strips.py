@@ -0,0 +1,315 @@
+"""Strip-based pipeline for very large textures with a bounded working set.
+
+generate_texture_set_in_strips produces the same pixels as
+mask_map_core.generate_texture_set, but derives, packs and encodes every output in
+horizontal bands. Grayscale planes are kept in disk-backed memory maps, the Sobel
+kernel reads one halo row above and below each band, and the PNGs are written row
+band by row band with a streaming zlib encoder. The band height follows from a
+memory budget, so the working set no longer grows with the image.
+
+Pillow has no incremental decoder, so each input is still decoded whole once; it is
+released again as soon as it has been copied into its plane.
+"""
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from mask_map_core import (MASK_CHANNELS, TEXTURE_SUFFIXES, ConstantChannel, MaskMapCancelled, MaskMapError,
+                           _remove_outputs, can_copy_bytes, channel_transforms, encode_options, gradient_max,
+                           is_constant_channel, normal_band, output_dir_for, pack_mask_map, resize_filter_for,
+                           resize_input)
+from mask_map_trace import NULL_TRACER
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 ** 2
+# Rough per-pixel working set of one band: Sobel temporaries and float64 gradients,
+# the derived channels, the packed RGBA row and the PNG filter buffer.
+BAND_BYTES_PER_PIXEL = 64
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_COLOR_TYPES = {"L": (0, 1), "RGB": (2, 3), "RGBA": (6, 4)}
+PNG_FILTER_UP = 2
+
+
+def compress_level_for(save_options):
+    """The zlib level PngStripWriter should use for an encode profile's save options."""
+    if save_options.get("optimize"):
+        return 9
+    return save_options.get("compress_level", 6)
+
+
+def band_rows_for(width, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """Return the band height that keeps one band of a width-wide image inside memory_budget."""
+    return max(1, int(memory_budget) // (max(width, 1) * BAND_BYTES_PER_PIXEL))
+
+
+class PngStripWriter:
+    """Write an 8-bit L/RGB/RGBA PNG one band of rows at a time.
+
+    Rows are stored with the PNG "Up" filter and compressed by a single streaming
+    zlib object, so only the current band is ever held in memory.
+    """
+
+    def __init__(self, path, size, mode, compress_level=6):
+        self.width, self.height = size
+        color_type, self.channels = PNG_COLOR_TYPES[mode]
+        self.rows_written = 0
+        self.previous_row = np.zeros(self.width * self.channels, dtype=np.uint8)
+        self.compressor = zlib.compressobj(compress_level)
+        self.file = open(path, "wb")
+        self.file.write(PNG_SIGNATURE)
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, color_type, 0, 0, 0))
+
+    def _chunk(self, chunk_type, data):
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(chunk_type)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+    def write_rows(self, rows):
+        """Append a (band_height, width[, channels]) uint8 array of rows."""
+        rows = np.ascontiguousarray(rows, dtype=np.uint8).reshape(len(rows), -1)
+        filtered = np.empty((len(rows), rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = PNG_FILTER_UP
+        filtered[0, 1:] = rows[0] - self.previous_row
+        filtered[1:, 1:] = rows[1:] - rows[:-1]
+        self.previous_row = rows[-1].copy()
+        self.rows_written += len(rows)
+        data = self.compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"PNG expects {self.height} rows, {self.rows_written} were written")
+            self._chunk(b"IDAT", self.compressor.flush())
+            self._chunk(b"IEND", b"")
+        finally:
+            self.file.close()
+
+
+def _fill_plane(img, plane, band_rows, histogram=None):
+    """Convert img to grayscale band by band into plane, accumulating its histogram."""
+    width, height = img.size
+    for top in range(0, height, band_rows):
+        bottom = min(top + band_rows, height)
+        band = np.array(img.crop((0, top, width, bottom)).convert("L"))
+        plane[top:bottom] = band
+        if histogram is not None:
+            histogram += np.bincount(band.ravel(), minlength=256)
+    plane.flush()
+
+
+def generate_texture_set_in_strips(albedo_path, texture_paths=None, progress=None, write_channels=True,
+                                   cancel_event=None, memory_budget=DEFAULT_MEMORY_BUDGET, transforms=None, tracer=None,
+                                   encode_profile="default", write_constant_channels=True, resize_filters=None,
+                                   reduce_inputs=False):
+    """Strip-based equivalent of mask_map_core.generate_texture_set.
+
+    Takes the same texture_paths, progress, write_channels, cancel_event, transforms, tracer,
+    encode_profile, write_constant_channels, resize_filters and reduce_inputs arguments
+    and writes the same files; memory_budget (bytes) sets the band height. Cancellation
+    is checked between bands.
+    """
+    texture_paths = texture_paths or {}
+    tracer = tracer or NULL_TRACER
+    save_options = encode_options(encode_profile)
+    compress_level = compress_level_for(save_options)
+    filters = {suffix: resize_filter_for(suffix, resize_filters) for suffix in TEXTURE_SUFFIXES}
+    total_steps = 7  # Albedo + 5 textures (emissive, roughness, metallic, specular, normal) + mask map
+    current_step = 0
+
+    def report(key, **params):
+        if progress:
+            progress(current_step, total_steps, key, **params)
+
+    def check_cancelled():
+        if cancel_event is not None and cancel_event.is_set():
+            raise MaskMapCancelled()
+
+    if not albedo_path or not os.path.exists(albedo_path):
+        raise MaskMapError("error_albedo_missing")
+
+    albedo_name = Path(albedo_path).stem
+    output_dir = output_dir_for(albedo_path)
+    created_dir = not os.path.isdir(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    writers = {}
+    planes = {}
+
+    def output_path_for(suffix):
+        return os.path.join(output_dir, f"{albedo_name}_{suffix}.png")
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="bakin_strips_", ignore_cleanup_errors=True) as plane_dir:
+            try:
+                albedo_img = Image.open(albedo_path)
+                albedo_size = albedo_img.size
+            except Exception as e:
+                raise MaskMapError("error_albedo_read", e) from e
+            width, height = albedo_size
+            band_rows = band_rows_for(width, memory_budget)
+
+            def new_plane(name):
+                return np.memmap(os.path.join(plane_dir, name), dtype=np.uint8, mode="w+", shape=(height, width))
+
+            histogram = np.zeros(256, dtype=np.int64)
+            try:
+                with albedo_img:
+                    albedo_output = output_path_for("albedo")
+                    with tracer.stage("albedo.decode", input_path=albedo_path, width=width, height=height):
+                        albedo_img.load()
+                    if can_copy_bytes(albedo_img):
+                        with tracer.stage("albedo.copy", input_path=albedo_path):
+                            shutil.copyfile(albedo_path, albedo_output)
+                    else:
+                        with tracer.stage("albedo.encode") as record:
+                            albedo_img.save(albedo_output, **save_options)
+                            record["output_path"] = albedo_output
+                    written.append(albedo_output)
+                    planes["gray"] = new_plane("gray")
+                    with tracer.stage("albedo.grayscale", width=width, height=height, band_rows=band_rows):
+                        _fill_plane(albedo_img, planes["gray"], band_rows, histogram)
+            except Exception as e:
+                raise MaskMapError("error_albedo_copy", e) from e
+            current_step += 1
+            report("progress_albedo")
+
+            generated = []
+            for suffix in TEXTURE_SUFFIXES:
+                check_cancelled()
+                texture_path = texture_paths.get(suffix)
+                has_source = bool(texture_path) and os.path.exists(texture_path)
+                constant = not has_source and is_constant_channel(suffix, transforms)
+                write = (write_channels and (write_constant_channels or not constant)) or suffix not in MASK_CHANNELS
+                try:
+                    if has_source:
+                        with Image.open(texture_path) as img:
+                            with tracer.stage(f"{suffix}.decode", input_path=texture_path,
+                                              width=img.width, height=img.height):
+                                img.load()
+                            copy_bytes = img.size == albedo_size and can_copy_bytes(img)
+                            if img.size != albedo_size:
+                                with tracer.stage(f"{suffix}.resize", width=width, height=height):
+                                    img = resize_input(img, albedo_size, filters[suffix], reduce_inputs)
+                            if write and copy_bytes:
+                                with tracer.stage(f"{suffix}.copy", input_path=texture_path):
+                                    shutil.copyfile(texture_path, output_path_for(suffix))
+                            elif write:
+                                with tracer.stage(f"{suffix}.encode") as record:
+                                    img.save(output_path_for(suffix), **save_options)
+                                    record["output_path"] = output_path_for(suffix)
+                            if write:
+                                written.append(output_path_for(suffix))
+                            if suffix in MASK_CHANNELS:
+                                planes[suffix] = new_plane(suffix)
+                                with tracer.stage(f"{suffix}.grayscale", width=width, height=height):
+                                    _fill_plane(img, planes[suffix], band_rows)
+                        current_step += 1
+                        if suffix == "normal":
+                            report("progress_normal", action="copied")
+                        else:
+                            report("progress_copy", suffix=suffix)
+                    else:
+                        generated.append(suffix)
+                        if write:
+                            writers[suffix] = PngStripWriter(output_path_for(suffix), albedo_size, "RGB" if suffix == "normal" else "L",
+                                                             compress_level)
+                            written.append(output_path_for(suffix))
+                except Exception as e:
+                    raise MaskMapError("error_texture", e, suffix=suffix) from e
+
+            mask_output = output_path_for("mask")
+            try:
+                writers["mask"] = PngStripWriter(mask_output, albedo_size, "RGBA", compress_level)
+                written.append(mask_output)
+            except Exception as e:
+                raise MaskMapError("error_mask", e) from e
+
+            gray = planes["gray"]
+            # Channel transforms only depend on the whole-image histogram, so each one
+            # compiles to a single lookup table that is then applied band by band.
+            luts = {suffix: transform.compile(histogram) for suffix, transform in channel_transforms(transforms).items()}
+            max_grad_x = max_grad_y = 0.0
+            if "normal" in writers:
+                # The normal map is normalised by the largest gradient of the whole image.
+                with tracer.stage("normal.gradient_max", width=width, height=height, band_rows=band_rows):
+                    for top in range(0, height, band_rows):
+                        check_cancelled()
+                        band_max_x, band_max_y = gradient_max(gray, top, min(top + band_rows, height))
+                        max_grad_x = max(max_grad_x, band_max_x)
+                        max_grad_y = max(max_grad_y, band_max_y)
+
+            with tracer.stage("bands", width=width, height=height, band_rows=band_rows, outputs=",".join(writers)):
+                for top in range(0, height, band_rows):
+                    check_cancelled()
+                    bottom = min(top + band_rows, height)
+                    gray_band = np.asarray(gray[top:bottom])
+                    bands = {}
+                    for suffix in MASK_CHANNELS:
+                        if suffix in planes:
+                            bands[suffix] = np.asarray(planes[suffix][top:bottom])
+                        elif suffix in luts:
+                            bands[suffix] = luts[suffix][gray_band]
+                        else:
+                            bands[suffix] = ConstantChannel(0, gray_band.shape)
+
+                    try:
+                        for suffix in generated:
+                            if suffix not in writers:
+                                continue
+                            if suffix == "normal":
+                                writers[suffix].write_rows(normal_band(gray, top, bottom, max_grad_x, max_grad_y))
+                            elif isinstance(bands[suffix], ConstantChannel):
+                                writers[suffix].write_rows(bands[suffix].to_array())
+                            else:
+                                writers[suffix].write_rows(bands[suffix])
+                    except Exception as e:
+                        raise MaskMapError("error_texture", e, suffix=suffix) from e
+
+                    try:
+                        writers["mask"].write_rows(pack_mask_map(*(bands[suffix] for suffix in MASK_CHANNELS)))
+                    except Exception as e:
+                        raise MaskMapError("error_mask", e) from e
+
+            for suffix in generated:
+                try:
+                    if suffix in writers:
+                        writers.pop(suffix).close()
+                except Exception as e:
+                    raise MaskMapError("error_texture", e, suffix=suffix) from e
+                current_step += 1
+                if suffix == "normal":
+                    report("progress_normal", action="generated")
+                else:
+                    report("progress_generate", suffix=suffix)
+
+            report("progress_mask")
+            try:
+                writers.pop("mask").close()
+            except Exception as e:
+                raise MaskMapError("error_mask", e) from e
+            current_step += 1
+            report("progress_complete")
+            # Memory maps must be released before their directory is removed.
+            planes.clear()
+            gray = None
+    except MaskMapCancelled:
+        for writer in writers.values():
+            writer.file.close()
+        _remove_outputs(written, output_dir, created_dir)
+        raise
+    finally:
+        for writer in writers.values():
+            writer.file.close()
+        planes.clear()
+    return output_dir
@@ -0,0 +1,146 @@
+"""Per-stage instrumentation for the mask map pipeline.
+
+Pass a StageTracer as tracer= to mask_map_core.generate_texture_set to record the
+wall time, CPU time, input/output bytes and image size of every stage. Records can
+be exported as JSON, CSV or a Chrome trace-event file (open it in chrome://tracing
+or https://ui.perfetto.dev). Without a tracer the pipeline uses NULL_TRACER, whose
+stages do nothing; file sizes are only looked up by a StageTracer, so an untraced
+run does not stat any file for them.
+
+profile_call wraps a single run in cProfile.
+"""
+import cProfile
+import csv
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+CSV_FIELDS = ("name", "start", "wall", "cpu", "pid", "tid", "input_bytes", "output_bytes", "width", "height")
+
+
+def file_size(path):
+    """Size of path in bytes, or None if it does not exist."""
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return None
+
+
+class StageTracer:
+    """Collects one record per stage; safe to share between the pipeline's threads."""
+
+    def __init__(self, **attrs):
+        self.attrs = attrs
+        self.records = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, input_path=None, **attrs):
+        """Time the enclosed block. Yields the record dict so the stage can add
+        width/height or other attributes once they are known.
+
+        The size of input_path is recorded as input_bytes. A stage that writes a file
+        sets record["output_path"], whose size is recorded as output_bytes at the end.
+        """
+        record = dict(self.attrs, name=name, **attrs)
+        if input_path is not None:
+            record["input_bytes"] = file_size(input_path)
+        start = time.time()
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield record
+        finally:
+            record["cpu"] = time.thread_time() - cpu_start
+            record["wall"] = time.perf_counter() - wall_start
+            if "output_path" in record:
+                record["output_bytes"] = file_size(record.pop("output_path"))
+            record["start"] = start
+            record["pid"] = os.getpid()
+            record["tid"] = threading.get_ident()
+            with self._lock:
+                self.records.append(record)
+
+    def extend(self, records):
+        """Add records collected elsewhere, e.g. by a tracer in a worker process."""
+        with self._lock:
+            self.records.extend(records)
+
+    def to_json(self):
+        return json.dumps({"stages": self.records}, indent=2, default=str)
+
+    def to_csv(self):
+        extra = sorted({key for record in self.records for key in record} - set(CSV_FIELDS))
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=list(CSV_FIELDS) + extra, lineterminator="\n")
+        writer.writeheader()
+        for record in self.records:
+            writer.writerow(record)
+        return out.getvalue()
+
+    def to_chrome_trace(self):
+        events = []
+        for record in self.records:
+            args = {key: value for key, value in record.items() if key not in ("name", "start", "wall", "pid", "tid")}
+            events.append({
+                "name": record["name"],
+                "cat": "mask_map",
+                "ph": "X",
+                "ts": record["start"] * 1e6,
+                "dur": record["wall"] * 1e6,
+                "pid": record["pid"],
+                "tid": record["tid"],
+                "args": args,
+            })
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, default=str)
+
+    def export(self, path, trace_format=None):
+        """Write the records to path as "json", "csv" or "chrome" (guessed from the extension if omitted)."""
+        if trace_format is None:
+            if path.endswith(".csv"):
+                trace_format = "csv"
+            elif path.endswith(".trace.json") or path.endswith(".trace"):
+                trace_format = "chrome"
+            else:
+                trace_format = "json"
+        text = {"json": self.to_json, "csv": self.to_csv, "chrome": self.to_chrome_trace}[trace_format]()
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+
+
+class _NullTracer:
+    """Stand-in used when tracing is off; its stages record nothing."""
+
+    records = ()
+
+    @contextmanager
+    def stage(self, name, input_path=None, **attrs):
+        yield {}
+
+
+NULL_TRACER = _NullTracer()
+
+
+def profile_call(func, output_path=None, top=25):
+    """Run func() under cProfile and return its result.
+
+    The stats are dumped to output_path (a .prof file for snakeviz/pstats) when given,
+    and the top entries by cumulative time are returned as text alongside the result.
+    Only the calling thread is profiled, so run generate_texture_set with
+    stage_workers=0 and encode_workers=0 to keep every stage on that thread.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        result = func()
+    finally:
+        profiler.disable()
+    if output_path:
+        profiler.dump_stats(output_path)
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(top)
+    return result, summary.getvalue()
@@ -0,0 +1,105 @@
+"""Per-pixel grayscale channel transforms compiled into a single lookup table.
+
+A ChannelTransform is an ordered chain of steps (invert, contrast, gamma, levels).
+Instead of producing a new image per step, the chain is compiled into one 256-entry
+table and applied to the grayscale buffer in a single pass. Contrast keeps the
+ImageEnhance.Contrast semantics: it blends towards the mean of the image as it is at
+that point in the chain, and the blend itself is evaluated by Pillow, so the default
+roughness and specular transforms give exactly the old ImageEnhance results.
+"""
+import numpy as np
+from PIL import Image
+
+LUT_SIZE = 256
+_RAMP = np.arange(LUT_SIZE, dtype=np.uint8)
+
+
+def contrast_mean(histogram):
+    """The mean ImageEnhance.Contrast blends towards, computed from a 256-bin histogram."""
+    total = int(histogram.sum())
+    if total == 0:
+        return 0
+    return int(int(np.dot(np.arange(LUT_SIZE, dtype=np.int64), histogram)) / total + 0.5)
+
+
+def _contrast_lut(mean, factor):
+    ramp = Image.frombytes("L", (LUT_SIZE, 1), _RAMP.tobytes())
+    return np.array(Image.blend(Image.new("L", ramp.size, mean), ramp, factor)).ravel()
+
+
+def _levels_lut(in_black, in_white, out_black, out_white):
+    span = max(in_white - in_black, 1e-6)
+    t = np.clip((np.arange(LUT_SIZE, dtype=float) - in_black) / span, 0.0, 1.0)
+    return np.clip(np.rint(out_black + t * (out_white - out_black)), 0, 255).astype(np.uint8)
+
+
+def _gamma_lut(gamma):
+    t = np.arange(LUT_SIZE, dtype=float) / 255.0
+    return np.clip(np.rint(255.0 * t ** (1.0 / gamma)), 0, 255).astype(np.uint8)
+
+
+class ChannelTransform:
+    """An immutable chain of grayscale steps; each builder method returns a new transform."""
+
+    def __init__(self, steps=()):
+        self.steps = tuple(steps)
+
+    def _then(self, *step):
+        return ChannelTransform(self.steps + (step,))
+
+    def invert(self):
+        return self._then("invert")
+
+    def contrast(self, factor):
+        """ImageEnhance.Contrast: 1.0 keeps the image, 0.0 gives its mean gray."""
+        return self._then("contrast", float(factor))
+
+    def gamma(self, gamma):
+        """Gamma curve; values above 1.0 brighten the midtones."""
+        if gamma <= 0:
+            raise ValueError("gamma must be positive")
+        return self._then("gamma", float(gamma))
+
+    def levels(self, in_black=0, in_white=255, out_black=0, out_white=255):
+        """Map [in_black, in_white] linearly onto [out_black, out_white], clipping outside."""
+        return self._then("levels", float(in_black), float(in_white), float(out_black), float(out_white))
+
+    @property
+    def needs_histogram(self):
+        return any(step[0] == "contrast" for step in self.steps)
+
+    def compile(self, histogram=None):
+        """Compile the chain into a uint8 LUT; histogram is the input's 256-bin histogram."""
+        lut = _RAMP.copy()
+        for step in self.steps:
+            kind = step[0]
+            if kind == "invert":
+                step_lut = 255 - _RAMP
+            elif kind == "contrast":
+                if histogram is None:
+                    raise ValueError("a contrast step needs the input histogram")
+                # Histogram of the image after the steps so far.
+                current = np.bincount(lut, weights=histogram, minlength=LUT_SIZE).astype(np.int64)
+                step_lut = _contrast_lut(contrast_mean(current), step[1])
+            elif kind == "gamma":
+                step_lut = _gamma_lut(step[1])
+            elif kind == "levels":
+                step_lut = _levels_lut(*step[1:])
+            else:
+                raise ValueError(f"unknown transform step {kind!r}")
+            lut = step_lut[lut]
+        return lut
+
+    def apply(self, gray):
+        """Apply the transform to a uint8 grayscale array in one lookup pass."""
+        histogram = np.bincount(gray.ravel(), minlength=LUT_SIZE) if self.needs_histogram else None
+        return self.compile(histogram)[gray]
+
+    def __eq__(self, other):
+        return isinstance(other, ChannelTransform) and self.steps == other.steps
+
+    def __hash__(self):
+        return hash(self.steps)
+
+    def __repr__(self):
+        return f"ChannelTransform({self.steps!r})"
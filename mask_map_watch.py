@@ -0,0 +1,247 @@
+"""Watch mode: regenerate Bakin mask maps whenever their source textures change.
+
+The watched folders are polled for file modification times, so no file system
+notification service is needed. A texture set is regenerated once none of its files
+has changed for the debounce interval, so a burst of saves from a paint tool triggers
+a single run. Runs go through the output cache, which restores every stage whose
+inputs did not change, and at most --workers sets are processed at a time on
+lower-priority worker processes.
+
+At startup, sets whose mask map is missing or older than their sources are queued.
+
+Usage:
+    python mask_map_watch.py textures/ --recursive --workers 2
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from mask_map_batch import find_texture_sets, process_texture_set
+from mask_map_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from mask_map_core import ENCODE_PROFILES, MIP_CHAIN, output_dir_for
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_WORKERS = max((os.cpu_count() or 2) // 2, 1)
+WORKER_NICENESS = 10
+
+
+def _file_signature(paths):
+    """(path, mtime_ns, size) of every path, or None if one of them is missing."""
+    signature = []
+    for path in sorted(paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def _is_stale(albedo_path, signature):
+    """True if the set's mask map is missing or older than any of its sources."""
+    mask_path = os.path.join(output_dir_for(albedo_path), f"{Path(albedo_path).stem}_mask.png")
+    try:
+        mask_mtime = os.stat(mask_path).st_mtime_ns
+    except OSError:
+        return True
+    return any(mtime > mask_mtime for _, mtime, _ in signature)
+
+
+class TextureWatcher:
+    """Polls the texture sets under inputs and reports those that changed and settled."""
+
+    def __init__(self, inputs, recursive=False, debounce=DEFAULT_DEBOUNCE):
+        self.inputs = inputs
+        self.recursive = recursive
+        self.debounce = debounce
+        self.signatures = {}
+        self.texture_paths = {}
+        self.pending = {}
+        self.skipped = set()
+        self.scanned = False
+
+    def poll(self, now=None):
+        """Scan once and return [(albedo_path, texture_paths)] of the sets that are due.
+
+        A set is due when its files (including added or removed channel textures)
+        changed and then stayed unchanged for debounce seconds. On the first scan,
+        sets with a missing or outdated mask map count as changed. The (path, suffix)
+        pairs of images skipped as other maps are kept in self.skipped.
+        """
+        now = time.monotonic() if now is None else now
+        current = {}
+        skipped = []
+        for albedo_path, texture_paths in find_texture_sets(self.inputs, self.recursive, skipped):
+            signature = _file_signature([albedo_path] + list(texture_paths.values()))
+            current[albedo_path] = signature
+            if signature is None:
+                # Removed while scanning; look again on the next poll.
+                self.pending[albedo_path] = now
+                continue
+            self.texture_paths[albedo_path] = texture_paths
+            if self.scanned:
+                changed = self.signatures.get(albedo_path) != signature
+            else:
+                changed = _is_stale(albedo_path, signature)
+            if changed:
+                self.pending[albedo_path] = now
+
+        for albedo_path in set(self.signatures) - set(current):
+            self.pending.pop(albedo_path, None)
+            self.texture_paths.pop(albedo_path, None)
+        self.signatures = current
+        self.skipped = set(skipped)
+        self.scanned = True
+
+        due = []
+        for albedo_path, changed_at in sorted(self.pending.items()):
+            if now - changed_at >= self.debounce and self.signatures.get(albedo_path) is not None:
+                due.append((albedo_path, self.texture_paths[albedo_path]))
+        for albedo_path, _ in due:
+            del self.pending[albedo_path]
+        return due
+
+
+def _lower_priority():
+    """Worker initializer: run jobs below normal priority so the machine stays responsive."""
+    if hasattr(os, "nice"):
+        try:
+            os.nice(WORKER_NICENESS)
+        except OSError:
+            pass
+
+
+def _new_executor(workers):
+    return ProcessPoolExecutor(max_workers=workers, initializer=_lower_priority)
+
+
+def watch(inputs, recursive=False, interval=DEFAULT_INTERVAL, debounce=DEFAULT_DEBOUNCE, workers=DEFAULT_WORKERS,
+          stop_event=None, out=sys.stderr, **options):
+    """Regenerate changed texture sets until stop_event (a threading.Event) is set.
+
+    options are passed on to mask_map_batch.process_texture_set. At most workers sets
+    run at a time; a set that changes again while it is queued or running is only
+    regenerated once more, after the current run.
+
+    If a worker process dies, the worker pool is restarted and the sets that were
+    running are queued again. Each of them is then run on its own, so a set that
+    crashes a second time is reported as failed instead of taking the others down.
+    """
+    stop_event = stop_event or threading.Event()
+    watcher = TextureWatcher(inputs, recursive, debounce)
+    workers = max(int(workers), 1)
+    queued = {}
+    running = {}
+    crashed = set()
+    reported_skips = set()
+    executor = _new_executor(workers)
+    try:
+        while not stop_event.is_set():
+            for albedo_path, texture_paths in watcher.poll():
+                queued[albedo_path] = texture_paths
+            for path, suffix in sorted(watcher.skipped - reported_skips):
+                print(f"skipped {path}: looks like the _{suffix} map of another texture", file=out)
+            reported_skips = watcher.skipped
+
+            broken = False
+            for albedo_path, (future, texture_paths) in list(running.items()):
+                if not future.done():
+                    continue
+                del running[albedo_path]
+                stamp = time.strftime("%H:%M:%S")
+                try:
+                    _, _, error, _ = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    if albedo_path not in crashed:
+                        crashed.add(albedo_path)
+                        queued.setdefault(albedo_path, texture_paths)
+                        continue
+                    error = "worker process crashed (out of memory?)"
+                except Exception as e:
+                    error = str(e) or type(e).__name__
+                crashed.discard(albedo_path)
+                if error is None:
+                    print(f"[{stamp}] ok      {albedo_path}", file=out)
+                else:
+                    print(f"[{stamp}] FAILED  {albedo_path}: {error}", file=out)
+
+            for albedo_path in list(queued):
+                if broken or len(running) >= workers or crashed & set(running):
+                    break
+                if albedo_path in running:
+                    continue
+                if albedo_path in crashed and running:
+                    # Let the others finish so this set runs on its own.
+                    break
+                try:
+                    future = executor.submit(process_texture_set, albedo_path, queued[albedo_path], **options)
+                except BrokenProcessPool:
+                    broken = True
+                    break
+                running[albedo_path] = (future, queued.pop(albedo_path))
+
+            if broken:
+                print(f"[{time.strftime('%H:%M:%S')}] a worker process crashed; restarting the workers", file=out)
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = _new_executor(workers)
+                continue
+            stop_event.wait(interval)
+        for future, _ in running.values():
+            future.cancel()
+    finally:
+        executor.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch texture directories and regenerate Bakin mask maps when they change.")
+    parser.add_argument("inputs", nargs="+", help="Directories or glob patterns of albedo textures.")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Descend into subdirectories of directory inputs.")
+    parser.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Texture sets processed at the same time (default: %(default)s).")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, metavar="SECONDS",
+                        help="Seconds between scans (default: %(default)s).")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE, metavar="SECONDS",
+                        help="Wait until a set's files have not changed for this long (default: %(default)s).")
+    parser.add_argument("--skip-channel-files", action="store_true",
+                        help="Only write the albedo, normal and mask maps, not the emissive/roughness/metallic/specular files.")
+    parser.add_argument("--skip-constant-channels", action="store_true",
+                        help="Do not write the all-black emissive/metallic files of sets that have no such input.")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_DIR, metavar="DIR",
+                        help="Cache directory used to skip unchanged stages (default: %(default)s).")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES // 1024 ** 2, metavar="MB",
+                        help="Maximum cache size in megabytes; least recently used entries are evicted first.")
+    level_group = parser.add_mutually_exclusive_group()
+    level_group.add_argument("--levels", type=int, nargs="+", metavar="PX",
+                             help="Also write downscaled copies with these longest sides.")
+    level_group.add_argument("--mip-chain", action="store_true", help="Also write every mip level.")
+    parser.add_argument("--encode-profile", choices=tuple(ENCODE_PROFILES), default="default",
+                        help="PNG compression: fast, default or max.")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    options = {
+        "write_channels": not args.skip_channel_files,
+        "write_constant_channels": not args.skip_constant_channels,
+        "cache_dir": args.cache,
+        "cache_bytes": args.cache_size * 1024 ** 2,
+        "encode_profile": args.encode_profile,
+        "levels": MIP_CHAIN if args.mip_chain else args.levels,
+    }
+    print(f"Watching {', '.join(args.inputs)} (Ctrl+C to stop)...", file=sys.stderr)
+    try:
+        watch(args.inputs, args.recursive, args.interval, args.debounce, args.workers, **options)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+import os
+
+from PIL import Image
+
+from mask_map_batch import find_texture_sets
+
+
+def touch_images(directory, *names):
+    for name in names:
+        Image.new("RGB", (4, 4)).save(os.path.join(directory, name))
+
+
+def albedo_names(texture_sets):
+    return [os.path.basename(albedo_path) for albedo_path, _ in texture_sets]
+
+
+def test_channel_siblings_are_paired(tmp_path):
+    touch_images(tmp_path, "rock.png", "rock_Roughness.png", "rock_normal.png", "wood_albedo.png", "wood_metallic.png")
+    texture_sets = dict(find_texture_sets([str(tmp_path)]))
+    assert texture_sets == {
+        str(tmp_path / "rock.png"): {"roughness": str(tmp_path / "rock_Roughness.png"),
+                                     "normal": str(tmp_path / "rock_normal.png")},
+        str(tmp_path / "wood_albedo.png"): {"metallic": str(tmp_path / "wood_metallic.png")},
+    }
+
+
+def test_other_maps_of_a_set_are_skipped_and_reported(tmp_path):
+    touch_images(tmp_path, "rock.png", "rock_ao.png", "rock_height.png", "stone_albedo.png", "stone_AO.png")
+    skipped = []
+    assert albedo_names(find_texture_sets([str(tmp_path)], skipped=skipped)) == ["rock.png", "stone_albedo.png"]
+    assert sorted((os.path.basename(path), suffix) for path, suffix in skipped) == [
+        ("rock_ao.png", "ao"), ("rock_height.png", "height"), ("stone_AO.png", "ao")]
+
+
+def test_albedos_named_like_other_maps_are_kept(tmp_path):
+    touch_images(tmp_path, "robot_arm.png", "robot_arm_normal.png", "door_mask.png", "glass_alpha.png",
+                 "tree_bump.png")
+    skipped = []
+    texture_sets = find_texture_sets([str(tmp_path)], skipped=skipped)
+    assert albedo_names(texture_sets) == ["door_mask.png", "glass_alpha.png", "robot_arm.png", "tree_bump.png"]
+    assert dict(texture_sets)[str(tmp_path / "robot_arm.png")] == {"normal": str(tmp_path / "robot_arm_normal.png")}
+    assert skipped == []
+
+
+def test_output_folders_are_ignored(tmp_path):
+    touch_images(tmp_path, "rock.png")
+    (tmp_path / "rock_bakin_textures").mkdir()
+    touch_images(tmp_path / "rock_bakin_textures", "rock_mask.png", "rock.png")
+    assert albedo_names(find_texture_sets([str(tmp_path)], recursive=True)) == ["rock.png"]
@@ -0,0 +1,138 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image, ImageFile
+
+from mask_map_cache import OutputCache, cache_key
+from mask_map_core import contrast_transforms, generate_texture_set
+from mask_map_trace import StageTracer
+
+WIDTH, HEIGHT = 24, 16
+WORK_STEPS = ("decode", "grayscale", "resize", "derive", "pack", "encode", "copy", "level")
+
+
+def write_image(path, mode, size, seed):
+    rng = np.random.default_rng(seed)
+    shape = (size[1], size[0], len(mode)) if len(mode) > 1 else (size[1], size[0])
+    Image.fromarray(rng.integers(0, 256, size=shape, dtype=np.uint8), mode).save(path)
+    return str(path)
+
+
+@pytest.fixture
+def texture_set(tmp_path):
+    albedo_path = write_image(tmp_path / "rock.png", "RGB", (WIDTH, HEIGHT), 1)
+    texture_paths = {"metallic": write_image(tmp_path / "rock_metallic.png", "L", (WIDTH // 2, HEIGHT // 2), 2)}
+    return albedo_path, texture_paths
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return OutputCache(str(tmp_path / "cache"))
+
+
+def run(albedo_path, texture_paths, cache=None, **options):
+    """Run the pipeline; returns (output directory, tracer records by name)."""
+    tracer = StageTracer()
+    output_dir = generate_texture_set(albedo_path, texture_paths, cache=cache, tracer=tracer, **options)
+    return output_dir, {record["name"]: record for record in tracer.records}
+
+
+def read_outputs(output_dir):
+    """{file name: (file bytes, pixels)} of every file in output_dir."""
+    outputs = {}
+    for name in sorted(os.listdir(output_dir)):
+        path = os.path.join(output_dir, name)
+        with open(path, "rb") as f, Image.open(path) as img:
+            outputs[name] = (f.read(), np.array(img))
+    return outputs
+
+
+def work_stages(records):
+    return sorted(name for name in records if name.rpartition(".")[2] in WORK_STEPS)
+
+
+def file_bytes(outputs):
+    return {name: data for name, (data, _) in outputs.items()}
+
+
+def assert_same_pixels(outputs, expected):
+    assert sorted(outputs) == sorted(expected)
+    for name, (_, pixels) in expected.items():
+        np.testing.assert_array_equal(outputs[name][1], pixels, err_msg=name)
+
+
+def test_unchanged_set_is_restored_without_decoding(texture_set, cache, monkeypatch):
+    run(*texture_set, cache=cache)
+    decoded = []
+    original_load = ImageFile.ImageFile.load
+    monkeypatch.setattr(ImageFile.ImageFile, "load", lambda img: decoded.append(img.filename) or original_load(img))
+    _, records = run(*texture_set, cache=cache)
+    assert decoded == []
+    # The all-black emissive file is cheaper to rebuild than to restore.
+    assert work_stages(records) == ["emissive.encode"]
+    restores = [record for name, record in records.items() if name.endswith(".restore")]
+    assert restores and all(record["cache_hit"] for record in restores)
+
+
+def test_restored_outputs_match_an_uncached_run(texture_set, cache):
+    first = read_outputs(run(*texture_set, cache=cache)[0])
+    restored = read_outputs(run(*texture_set, cache=cache)[0])
+    uncached = read_outputs(run(*texture_set)[0])
+    assert file_bytes(restored) == file_bytes(first)
+    assert_same_pixels(restored, uncached)
+
+
+@pytest.mark.parametrize("change, missed", [
+    ({"transforms": contrast_transforms(roughness_contrast=2.5)}, ["roughness"]),
+    ({"transforms": contrast_transforms(specular_contrast=0.5)}, ["specular"]),
+    ({"resize_filters": {"metallic": "nearest"}}, ["metallic"]),
+    ({"encode_profile": "fast"}, ["albedo", "metallic", "normal", "roughness", "specular"]),
+])
+def test_changed_parameters_miss_the_cache(texture_set, cache, change, missed):
+    run(*texture_set, cache=cache)
+    output_dir, records = run(*texture_set, cache=cache, **change)
+    outputs = read_outputs(output_dir)
+    misses = sorted(name.partition(".")[0] for name, record in records.items()
+                    if name.endswith(".restore") and not record["cache_hit"] and name != "mask.restore")
+    assert misses == missed
+    assert not records["mask.restore"]["cache_hit"]
+    uncached = read_outputs(run(*texture_set, **change)[0])
+    assert_same_pixels(outputs, uncached)
+
+
+@pytest.mark.parametrize("changed", ["albedo", "metallic"])
+def test_changed_input_file_misses_the_cache(texture_set, cache, changed):
+    albedo_path, texture_paths = texture_set
+    run(albedo_path, texture_paths, cache=cache)
+    if changed == "albedo":
+        write_image(albedo_path, "RGB", (WIDTH, HEIGHT), 3)
+    else:
+        write_image(texture_paths["metallic"], "L", (WIDTH // 2, HEIGHT // 2), 3)
+    output_dir, records = run(albedo_path, texture_paths, cache=cache)
+    outputs = read_outputs(output_dir)
+    assert not records["mask.restore"]["cache_hit"]
+    assert not records[f"{changed}.restore"]["cache_hit"]
+    uncached = read_outputs(run(albedo_path, texture_paths)[0])
+    assert_same_pixels(outputs, uncached)
+
+
+def test_eviction_keeps_the_cache_within_max_bytes(tmp_path):
+    entry_bytes = 1000
+    cache = OutputCache(str(tmp_path / "cache"), max_bytes=3 * entry_bytes)
+    keys = [cache_key("entry", index) for index in range(6)]
+    source = tmp_path / "entry.png"
+    source.write_bytes(b"x" * entry_bytes)
+    for index, key in enumerate(keys):
+        cache.store(key, str(source))
+        os.utime(cache._path(key, ".png"), (index, index))
+        if index == 2:
+            # A hit makes the oldest entry the most recently used one.
+            assert cache.restore(keys[0], str(tmp_path / "restored.png"))[0]
+            os.utime(cache._path(keys[0], ".png"), (index + 0.5, index + 0.5))
+    cache.evict()
+    cached = [index for index, key in enumerate(keys) if os.path.exists(cache._path(key, ".png"))]
+    total = sum(os.path.getsize(os.path.join(dirpath, name))
+                for dirpath, _, names in os.walk(cache.cache_dir) for name in names)
+    assert total <= cache.max_bytes
+    assert cached == [3, 4, 5]
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from mask_map_core import normal_from_gray, sobel_gradients, sobel_gradients_tiled
+
+SOBEL_X = np.array([[1, 0, -1], [2, 0, -2], [1, 0, -1]])
+SOBEL_Y = np.array([[1, 2, 1], [0, 0, 0], [-1, -2, -1]])
+
+SHAPES = [(1, 1), (1, 5), (5, 1), (2, 2), (2, 7), (7, 2), (3, 3), (3, 8), (17, 4), (31, 29), (64, 48)]
+
+
+def loop_gradients(gray):
+    """The original per-pixel implementation of the normal map's Sobel pass."""
+    height, width = gray.shape
+    grad_x = np.zeros_like(gray, dtype=float)
+    grad_y = np.zeros_like(gray, dtype=float)
+    for i in range(1, height - 1):
+        for j in range(1, width - 1):
+            grad_x[i, j] = np.sum(gray[i - 1:i + 2, j - 1:j + 2] * SOBEL_X)
+            grad_y[i, j] = np.sum(gray[i - 1:i + 2, j - 1:j + 2] * SOBEL_Y)
+    return grad_x, grad_y
+
+
+def random_gray(shape, seed):
+    return np.random.default_rng(seed).integers(0, 256, size=shape, dtype=np.uint8)
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("seed", range(3))
+def test_sobel_gradients_match_loop(shape, seed):
+    gray = random_gray(shape, seed)
+    expected_x, expected_y = loop_gradients(gray)
+    grad_x, grad_y = sobel_gradients(gray)
+    assert grad_x.dtype == expected_x.dtype and grad_y.dtype == expected_y.dtype
+    np.testing.assert_array_equal(grad_x, expected_x)
+    np.testing.assert_array_equal(grad_y, expected_y)
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("tile_rows", [1, 2, 3, 5, 7, 13, 256, 0])
+def test_sobel_gradients_tiled_match_loop(shape, tile_rows):
+    gray = random_gray(shape, tile_rows)
+    expected_x, expected_y = loop_gradients(gray)
+    grad_x, grad_y = sobel_gradients_tiled(gray, tile_rows)
+    np.testing.assert_array_equal(grad_x, expected_x)
+    np.testing.assert_array_equal(grad_y, expected_y)
+
+
+def test_extreme_values_do_not_overflow():
+    gray = np.zeros((9, 9), dtype=np.uint8)
+    gray[:, ::2] = 255
+    gray[::3] = 255
+    for grad, expected in zip(sobel_gradients_tiled(gray, 2), loop_gradients(gray)):
+        np.testing.assert_array_equal(grad, expected)
+
+
+@pytest.mark.parametrize("shape", [(3, 3), (4, 9), (23, 37), (64, 48)])
+@pytest.mark.parametrize("tile_rows", [1, 2, 5, 7, 256])
+def test_normal_from_gray_matches_loop(shape, tile_rows):
+    gray = random_gray(shape, tile_rows)
+    grad_x, grad_y = loop_gradients(gray)
+    expected = np.stack([
+        (grad_x / np.max(np.abs(grad_x)) * 127.5 + 127.5).astype(np.uint8),
+        (grad_y / np.max(np.abs(grad_y)) * 127.5 + 127.5).astype(np.uint8),
+        np.full(gray.shape, 255, dtype=np.uint8),
+    ], axis=-1)
+    np.testing.assert_array_equal(normal_from_gray(gray, tile_rows), expected)
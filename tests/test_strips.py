@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from mask_map_core import contrast_transforms, generate_texture_set
+from mask_map_strips import BAND_BYTES_PER_PIXEL, generate_texture_set_in_strips
+
+WIDTH, HEIGHT = 37, 29
+
+
+def write_image(path, mode, size, seed):
+    rng = np.random.default_rng(seed)
+    channels = len(mode)
+    shape = (size[1], size[0], channels) if channels > 1 else (size[1], size[0])
+    Image.fromarray(rng.integers(0, 256, size=shape, dtype=np.uint8), mode).save(path)
+    return str(path)
+
+
+def make_texture_set(directory, albedo_mode, inputs):
+    """Write rock.png and the given {suffix: (mode, size)} inputs; return (albedo_path, texture_paths)."""
+    directory.mkdir()
+    albedo_path = write_image(directory / "rock.png", albedo_mode, (WIDTH, HEIGHT), 1)
+    texture_paths = {suffix: write_image(directory / f"rock_{suffix}.png", mode, size, index + 2)
+                     for index, (suffix, (mode, size)) in enumerate(sorted(inputs.items()))}
+    return albedo_path, texture_paths
+
+
+def read_outputs(output_dir):
+    outputs = {}
+    for name in sorted(os.listdir(output_dir)):
+        with Image.open(os.path.join(output_dir, name)) as img:
+            outputs[name] = (img.mode, np.array(img))
+    return outputs
+
+
+CASES = {
+    "albedo only": ("RGB", {}, {}),
+    "rgba albedo": ("RGBA", {}, {}),
+    "inputs": ("RGB", {"emissive": ("L", (WIDTH, HEIGHT)), "roughness": ("RGB", (20, 15)),
+                       "normal": ("RGB", (74, 58))}, {}),
+    "reduced inputs": ("RGB", {"metallic": ("L", (WIDTH * 2, HEIGHT * 2)), "specular": ("L", (11, 40))},
+                       {"reduce_inputs": True, "resize_filters": {"specular": "nearest"}}),
+    "transforms": ("RGB", {}, {"transforms": contrast_transforms(2.5, 0.5)}),
+    "no constant channels": ("RGB", {"roughness": ("L", (WIDTH, HEIGHT))}, {"write_constant_channels": False}),
+}
+
+
+@pytest.mark.parametrize("case", sorted(CASES))
+@pytest.mark.parametrize("band_rows", [1, 2, 5, HEIGHT + 1])
+def test_strips_match_whole_image(tmp_path, case, band_rows):
+    albedo_mode, inputs, options = CASES[case]
+    whole_albedo, whole_textures = make_texture_set(tmp_path / "whole", albedo_mode, inputs)
+    strip_albedo, strip_textures = make_texture_set(tmp_path / "strips", albedo_mode, inputs)
+
+    whole_dir = generate_texture_set(whole_albedo, whole_textures, **options)
+    strip_dir = generate_texture_set_in_strips(strip_albedo, strip_textures,
+                                               memory_budget=band_rows * WIDTH * BAND_BYTES_PER_PIXEL, **options)
+
+    whole, strips = read_outputs(whole_dir), read_outputs(strip_dir)
+    assert sorted(strips) == sorted(whole)
+    for name, (mode, pixels) in whole.items():
+        assert strips[name][0] == mode, name
+        np.testing.assert_array_equal(strips[name][1], pixels, err_msg=name)
@@ -0,0 +1,31 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+import mask_map_trace
+from mask_map_core import generate_texture_set
+from mask_map_trace import StageTracer
+
+
+def write_albedo(directory):
+    path = str(directory / "rock.png")
+    Image.fromarray(np.random.default_rng(0).integers(0, 256, size=(12, 16, 3), dtype=np.uint8)).save(path)
+    return path
+
+
+def test_untraced_run_does_not_look_up_file_sizes(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(mask_map_trace, "file_size", lambda path: calls.append(path))
+    generate_texture_set(write_albedo(tmp_path), {})
+    assert calls == []
+
+
+def test_traced_run_records_file_sizes(tmp_path):
+    albedo_path = write_albedo(tmp_path)
+    tracer = StageTracer()
+    output_dir = generate_texture_set(albedo_path, {}, tracer=tracer)
+    records = {record["name"]: record for record in tracer.records}
+    assert records["albedo.open"]["input_bytes"] == os.path.getsize(albedo_path)
+    assert records["mask.encode"]["output_bytes"] == os.path.getsize(os.path.join(output_dir, "rock_mask.png"))
+    assert not any("output_path" in record for record in tracer.records)
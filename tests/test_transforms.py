@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance
+
+from mask_map_core import ROUGHNESS_TRANSFORM, SPECULAR_TRANSFORM
+from mask_map_transforms import ChannelTransform
+
+FACTORS = [0.0, 0.25, 0.5, 1.0, 1.5, 2.0, 3.7, -0.5]
+
+
+def gray_images():
+    rng = np.random.default_rng(0)
+    yield "uniform", rng.integers(0, 256, size=(31, 47), dtype=np.uint8)
+    yield "dark", (rng.random((40, 40)) ** 4 * 255).astype(np.uint8)
+    yield "bright", (255 - rng.random((17, 23)) ** 3 * 255).astype(np.uint8)
+    yield "narrow", rng.integers(120, 136, size=(9, 64), dtype=np.uint8)
+    yield "constant", np.full((8, 8), 77, dtype=np.uint8)
+    yield "one pixel", np.array([[200]], dtype=np.uint8)
+    yield "extremes", np.array([[0, 255] * 8] * 3, dtype=np.uint8)
+
+
+IMAGES = dict(gray_images())
+
+
+def enhance_contrast(gray, factor):
+    return np.array(ImageEnhance.Contrast(Image.fromarray(gray, "L")).enhance(factor))
+
+
+def pil_invert(gray):
+    return np.array(Image.eval(Image.fromarray(gray, "L"), lambda x: 255 - x))
+
+
+@pytest.mark.parametrize("name", sorted(IMAGES))
+@pytest.mark.parametrize("factor", FACTORS)
+def test_contrast_lut_matches_image_enhance(name, factor):
+    gray = IMAGES[name]
+    np.testing.assert_array_equal(ChannelTransform().contrast(factor).apply(gray), enhance_contrast(gray, factor))
+
+
+@pytest.mark.parametrize("name", sorted(IMAGES))
+def test_default_transforms_match_image_enhance(name):
+    gray = IMAGES[name]
+    np.testing.assert_array_equal(ROUGHNESS_TRANSFORM.apply(gray), enhance_contrast(pil_invert(gray), 1.5))
+    np.testing.assert_array_equal(SPECULAR_TRANSFORM.apply(gray), enhance_contrast(gray, 2.0))
+
+
+@pytest.mark.parametrize("name", sorted(IMAGES))
+def test_chained_contrast_uses_mean_at_that_step(name):
+    gray = IMAGES[name]
+    transform = ChannelTransform().invert().contrast(1.5).gamma(1.8).contrast(0.7)
+    expected = enhance_contrast(pil_invert(gray), 1.5)
+    expected = ChannelTransform().gamma(1.8).apply(expected)
+    expected = enhance_contrast(expected, 0.7)
+    np.testing.assert_array_equal(transform.apply(gray), expected)
+
+
+def test_contrast_needs_histogram():
+    with pytest.raises(ValueError):
+        ChannelTransform().contrast(2.0).compile()